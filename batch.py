@@ -0,0 +1,231 @@
+import io
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from pathlib import Path
+
+BASE = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent))
+
+sys.path.insert(0, str(BASE))
+sys.path.insert(0, str(BASE / 'scripts'))
+
+from openpyxl import Workbook, load_workbook
+
+import http_client
+import events
+import price_providers
+from http_cache import CACHE
+from history_store import HistoryStore, parse_age
+from stage_context import StageContext
+
+import onchain
+import performance_table_update_prices as performance
+
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+OUT_DIR = onchain.DOCS_DIR / "batch"
+JOBS    = int(os.environ.get("BATCH_JOBS", "0")) or os.cpu_count() or 1
+
+# Batch mode for one workbook per client:
+#   1. read every workbook (read-only) and build one in-memory sheet with the union of their rows;
+#   2. run the normal price/TVL stages on that sheet once, which records every value in the
+#      history store (the quote snapshot);
+#   3. update the workbooks in a process pool, each running the usual single-workbook path with
+#      --max-age covering the snapshot, so values come from the store instead of the network.
+# Network work scales with distinct assets, the per-workbook openpyxl work with cores.
+
+ONCHAIN_COLUMNS = ("B", "C", "D", "E")
+
+def find_workbooks(paths) -> list:
+    found = []
+    for p in paths:
+        if p.is_dir():
+            found += sorted(f for f in p.glob("*.xlsx") if not f.name.startswith("~$"))
+        elif p.exists():
+            found.append(p)
+        else:
+            log_warn(f"Skipping {p}: not found")
+    return list(dict.fromkeys(f.resolve() for f in found))
+
+def union_onchain_sheet(paths) -> tuple:
+    # Distinct ONCHAIN (name, ticker, slug, type) rows across workbooks, laid out like the real sheet.
+    from sheet_rows import read_rows, is_blank
+
+    seen = {}
+    for path in paths:
+        try:
+            rows = read_rows(path, onchain.SHEET_NAME, onchain.onchain_update_prices.START_ROW, ONCHAIN_COLUMNS,
+                             is_empty=lambda r: is_blank(r[2]),
+                             stop_empty_limit=onchain.onchain_update_prices.STOP_EMPTY_LIMIT)
+        except KeyError:
+            log_warn(f"{path.name}: sheet '{onchain.SHEET_NAME}' not found")
+            continue
+        for r in rows:
+            seen.setdefault((r.B, r.C, r.D, r.E), None)
+
+    ws = Workbook().active
+    ws.title = onchain.SHEET_NAME
+    for i, values in enumerate(seen, start=onchain.onchain_update_prices.START_ROW):
+        for col, value in zip(ONCHAIN_COLUMNS, values):
+            ws[f"{col}{i}"] = value
+    return ws, len(seen)
+
+def union_performance_tickers(paths) -> list:
+    # Tickers of yellow PERFORMANCE_TABLE price cells across workbooks.
+    tickers = {}
+    for path in paths:
+        wb = load_workbook(str(path), read_only=True)
+        try:
+            if performance.SHEET_NAME not in wb.sheetnames:
+                log_warn(f"{path.name}: sheet '{performance.SHEET_NAME}' not found")
+                continue
+            targets, _ = performance.select_rows(wb[performance.SHEET_NAME])
+            tickers.update((ticker, None) for _, ticker in targets)
+        finally:
+            wb.close()
+    return list(tickers)
+
+def prefetch_monthly(paths, args, store) -> None:
+    ws, rows = union_onchain_sheet(paths)
+    log_info(f"{rows} distinct ONCHAIN rows across {len(paths)} workbooks")
+    ctx = StageContext(ws=ws, docs_dir=onchain.DOCS_DIR, workers=args.workers, engine=args.engine,
+                       max_age=args.max_age, backfill=args.backfill)
+    ctx.shared["history"] = store
+    for module in (onchain.onchain_update_prices, onchain.onchain_update_tvl):
+        name = module.__name__.rsplit(".", 1)[-1]
+        with http_client.stage(f"prefetch:{name}"):
+            module.run(ctx)
+    if args.backfill is not None:
+        with http_client.stage("prefetch:onchain_rewrite_prices"):
+            onchain.onchain_rewrite_prices.run(ctx)
+
+def prefetch_weekly(paths, args, store) -> None:
+    prices  = onchain.onchain_update_prices
+    tickers = union_performance_tickers(paths)
+    fresh   = store.latest("price", (f"sym:{t}" for t in tickers), max_age=args.max_age) if args.max_age is not None else {}
+    stale   = [t for t in tickers if f"sym:{t}" not in fresh]
+    log_info(f"{len(tickers)} distinct PERFORMANCE_TABLE tickers across {len(paths)} workbooks, {len(stale)} to fetch")
+    if not stale:
+        return
+
+    with http_client.stage("prefetch:performance_table_update_prices"):
+        quoted, _ = prices.fetch_prices([(None, t, None) for t in stale], prices.load_api_key(), store)
+    for t in stale:
+        if f"sym:{t}" not in quoted:
+            log_warn(f"Symbol {t} not found in any price provider response.")
+
+def child_argv(command: str, src: Path, dst: Path, args) -> list:
+    argv = ["--input", str(src), "--output", str(dst), "--providers", args.providers,
+            "--price-budget", str(args.price_budget), "--hedge-after", str(args.hedge_after)]
+    if command == "monthly":
+        argv += ["--workers", str(args.workers), "--engine", args.engine]
+        if args.backfill is not None:
+            argv += ["--backfill"] + ([args.backfill] if args.backfill else [])
+        if args.no_cache:
+            argv.append("--no-cache")
+    return argv
+
+def update_one(command: str, argv: list, since: float, log_path: str) -> tuple:
+    # Runs in a pool process. The snapshot is everything the store got since the prefetch started.
+    events.TARGET = None
+    argv  = argv + ["--max-age", f"{time.time() - since + 1:.0f}"]
+    out   = io.StringIO()
+    start = time.monotonic()
+    ok, error = True, None
+    try:
+        with redirect_stdout(out):
+            if command == "monthly":
+                onchain.run(onchain.parse_args(argv))
+            else:
+                performance.main(argv)
+    except SystemExit as e:
+        ok, error = False, e.code if isinstance(e.code, str) else f"exited with {e.code}"
+    except Exception as e:
+        ok, error = False, str(e)
+    Path(log_path).write_text(out.getvalue(), encoding="utf-8")
+    return ok, error, time.monotonic() - start
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Update many client workbooks from one shared price/TVL snapshot.")
+    p.add_argument("command", choices=("monthly", "weekly"),
+                   help="monthly: ONCHAIN pipeline (onchain.py); weekly: PERFORMANCE_TABLE prices")
+    p.add_argument("paths", nargs="+", type=Path, help="Workbooks and/or directories of .xlsx files")
+    p.add_argument("--out-dir", type=Path, default=OUT_DIR, help="Where updated workbooks and per-workbook logs go")
+    p.add_argument("--jobs", type=int, default=JOBS, help="Worker processes (default: one per core)")
+    p.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP response cache")
+    p.add_argument("--workers", type=int, default=onchain.onchain_update_tvl.WORKERS,
+                   help="Concurrent DefiLlama /protocol requests during the prefetch")
+    p.add_argument("--engine", choices=("protocol", "listing"), default=onchain.onchain_update_tvl.ENGINE,
+                   help="TVL engine")
+    p.add_argument("--backfill", nargs="?", const="", default=None, metavar="YYYY-MM",
+                   help="monthly: fill the monthly price column with month-end closes")
+    p.add_argument("--max-age", type=parse_age, default=None,
+                   help="Also reuse history-store values newer than this during the prefetch (e.g. 15m, 2h)")
+    price_providers.add_arguments(p)
+    http_client.add_arguments(p)
+    events.add_arguments(p)
+    return p.parse_args(argv)
+
+def main():
+    args = parse_args()
+    CACHE.enabled = CACHE.enabled and not args.no_cache
+    http_client.configure_from_args(args)
+    events.configure(args.events)
+    price_providers.configure_from_args(args)
+
+    paths = find_workbooks(args.paths)
+    if not paths:
+        log_err("No workbooks found")
+        sys.exit(1)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    since = time.time()
+    store = HistoryStore()
+    try:
+        if args.command == "monthly":
+            prefetch_monthly(paths, args, store)
+        else:
+            prefetch_weekly(paths, args, store)
+    finally:
+        store.close()
+    http_client.log_stats()
+    log_ok(f"Snapshot ready in {time.time() - since:.1f}s, updating {len(paths)} workbooks with {args.jobs} process(es)")
+
+    failed   = 0
+    progress = events.Progress(len(paths), unit="workbooks")
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {}
+        for src in paths:
+            dst = args.out_dir / src.name
+            log = args.out_dir / f"{src.stem}.log"
+            fut = pool.submit(update_one, args.command, child_argv(args.command, src, dst, args), since, str(log))
+            futures[fut] = (src, dst, log)
+        for fut in as_completed(futures):
+            src, dst, log = futures[fut]
+            try:
+                ok, error, seconds = fut.result()
+            except Exception as e:
+                ok, error, seconds = False, str(e), 0.0
+            if ok:
+                events.file_written(dst)
+                log_ok(f"{src.name} → {dst} ({seconds:.1f}s)")
+            else:
+                failed += 1
+                log_err(f"{src.name} failed: {error} (see {log})")
+            progress.advance()
+
+    if failed:
+        log_err(f"{failed} of {len(paths)} workbooks failed")
+        sys.exit(1)
+    log_ok(f"All {len(paths)} workbooks updated")
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill
+
+import synthetic
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+
+ONCHAIN_FILE     = "Monthly_Performance_CVR.xlsx"
+PERFORMANCE_FILE = "Weekly_Performance_PORTFOLIO.xlsx"
+
+SECTION_SIZE = 50       # ONCHAIN rows per TVL block
+YELLOW_SHARE = 7        # out of 10 PERFORMANCE_TABLE rows get a yellow price cell
+
+YELLOW = PatternFill(fill_type="solid", fgColor="FFFFFF00")
+BOLD   = Font(bold=True)
+
+def make_onchain(path: Path, rows: int) -> None:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "ONCHAIN"
+    ws["B1"] = "Synthetic ONCHAIN benchmark sheet"
+    for col, title in zip("BCDEFGHOP", ("Name", "Symbols", "Slug", "Type", "Monthly", "Change", "Price", "TVL", "Share")):
+        ws[f"{col}3"] = title
+        ws[f"{col}3"].font = BOLD
+
+    r = 4
+    for start in range(0, rows, SECTION_SIZE):
+        ws[f"B{r}"] = f"Section {start // SECTION_SIZE + 1}"
+        ws[f"B{r}"].font = BOLD
+        r += 1
+        first, last = r, r + min(SECTION_SIZE, rows - start) - 1
+        for i in range(start, start + last - first + 1):
+            is_chain = i % synthetic.CHAIN_EVERY == 0
+            j = i % synthetic.CHAINS
+            ws[f"B{r}"] = synthetic.name(i)
+            ws[f"C{r}"] = synthetic.symbol(i)
+            ws[f"D{r}"] = synthetic.chain_name(j) if is_chain else synthetic.slug(i)
+            ws[f"E{r}"] = "chain" if is_chain else "protocol"
+            ws[f"F{r}"] = synthetic.price(i) * 0.9
+            ws[f"G{r}"] = f"=IFERROR(H{r}/F{r}-1,0)"
+            ws[f"H{r}"] = synthetic.price(i) * 0.95
+            ws[f"H{r}"].fill = YELLOW
+            ws[f"O{r}"] = synthetic.tvl(i) / 2
+            ws[f"P{r}"] = f"=O{r}/SUM(O${first}:O${last})"
+            r += 1
+
+    wb.save(str(path))
+
+def make_performance(path: Path, rows: int) -> None:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "PERFORMANCE_TABLE"
+    for col, title in zip("ABCDEFG", ("Asset", "Name", "Ticker", "Amount", "Price", "Value", "Weight")):
+        ws[f"{col}1"] = title
+        ws[f"{col}1"].font = BOLD
+
+    last = rows + 1
+    for i in range(rows):
+        r = i + 2
+        ws[f"A{r}"] = i + 1
+        ws[f"B{r}"] = synthetic.name(i)
+        ws[f"C{r}"] = synthetic.symbol(i)
+        ws[f"D{r}"] = (i % 97) + 1
+        ws[f"E{r}"] = synthetic.price(i) * 0.95
+        if i % 10 < YELLOW_SHARE:
+            ws[f"E{r}"].fill = YELLOW
+        ws[f"F{r}"] = f"=D{r}*E{r}"
+        ws[f"G{r}"] = f"=F{r}/SUM(F$2:F${last})"
+
+    wb.save(str(path))
+
+def make_workbooks(out_dir: Path, rows: int) -> tuple:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    onchain, performance = out_dir / ONCHAIN_FILE, out_dir / PERFORMANCE_FILE
+    make_onchain(onchain, rows)
+    make_performance(performance, rows)
+    return onchain, performance
+
+def main():
+    p = argparse.ArgumentParser(description="Generate synthetic ONCHAIN and PERFORMANCE_TABLE workbooks.")
+    p.add_argument("--rows", type=int, default=1000, help="Asset rows per sheet (e.g. 100 to 50000)")
+    p.add_argument("--out", type=Path, default=Path("bench_docs"), help="Output directory")
+    args = p.parse_args()
+
+    log_info(f"Generating {args.rows} rows per sheet in {args.out}…")
+    for path in make_workbooks(args.out, args.rows):
+        log_ok(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
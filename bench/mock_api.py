@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import synthetic
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+
+# Stand-in for the CMC, CoinGecko and DefiLlama endpoints the stages use. Point the scripts at it with
+#   HTTP_REDIRECTS=https://pro-api.coinmarketcap.com=http://127.0.0.1:PORT/cmc,https://api.llama.fi=http://127.0.0.1:PORT/llama,
+#                  https://api.coingecko.com=http://127.0.0.1:PORT/gecko,https://coins.llama.fi=http://127.0.0.1:PORT/coins
+
+class FixedWindow:
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.window     = 0
+        self.count      = 0
+        self.lock       = threading.Lock()
+
+    def admit(self) -> float:
+        # 0 when the request may proceed, otherwise seconds until the next window opens.
+        if self.per_minute <= 0:
+            return 0.0
+        with self.lock:
+            now = time.time()
+            window = int(now // 60)
+            if window != self.window:
+                self.window, self.count = window, 0
+            if self.count >= self.per_minute:
+                return 60 - now % 60
+            self.count += 1
+            return 0.0
+
+class MockApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, cmc_limit: int = 0, llama_limit: int = 0,
+                 tokens: int = 60000, api_latency: dict | None = None):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.api_latency = api_latency or {}
+        self.limits  = {"cmc": FixedWindow(cmc_limit), "llama": FixedWindow(llama_limit),
+                        "gecko": FixedWindow(0), "coins": FixedWindow(0)}
+        self.tokens  = tokens
+        self.map_body = json.dumps({"data": [
+            {"id": synthetic.cmc_id(i), "symbol": synthetic.symbol(i), "name": synthetic.name(i)}
+            for i in range(tokens)
+        ]}).encode("utf-8")
+
+def quote(i: int) -> dict:
+    return {"id": synthetic.cmc_id(i), "symbol": synthetic.symbol(i), "name": synthetic.name(i),
+            "quote": {"USD": {"price": synthetic.price(i)}}}
+
+def cmc_quotes(params: dict, tokens: int) -> tuple:
+    # (status, body). Like CMC, one unknown id or symbol fails the whole request unless
+    # skip_invalid=true is passed.
+    data, invalid = {}, []
+    for cmc_id in filter(None, params.get("id", "").split(",")):
+        i = int(cmc_id) - 1 if cmc_id.isdigit() else -1
+        if 0 <= i < tokens:
+            data[cmc_id] = quote(i)
+        else:
+            invalid.append(cmc_id)
+    for sym in filter(None, params.get("symbol", "").split(",")):
+        i = synthetic.index_of_symbol(sym)
+        if i is not None and i < tokens:
+            data[sym.upper()] = quote(i)
+        else:
+            invalid.append(sym)
+    if invalid and params.get("skip_invalid") != "true":
+        return 400, {"status": {"error_code": 400, "error_message": f"Invalid value: \"{','.join(invalid)}\""}}
+    return 200, {"data": data}
+
+def cmc_historical(params: dict) -> dict:
+    stamp = params.get("time_end", "")
+    return {"data": {
+        cmc_id: {"id": int(cmc_id), "quotes": [
+            {"timestamp": stamp, "quote": {"USD": {"price": synthetic.price(int(cmc_id) - 1) * 0.98}}}
+        ]}
+        for cmc_id in filter(None, params.get("id", "").split(","))
+    }}
+
+def llama_chains() -> list:
+    return [{"name": synthetic.chain_name(j), "tokenSymbol": synthetic.chain_symbol(j),
+             "tvl": synthetic.tvl(j) * 10} for j in range(synthetic.CHAINS)]
+
+def chain_tvls(i: int) -> dict:
+    total = synthetic.tvl(i)
+    return {"Ethereum": total * 0.7, "Arbitrum": total * 0.3, "staking": total * 0.1}
+
+def llama_listing() -> list:
+    return [{"slug": synthetic.slug(i), "symbol": synthetic.symbol(i), "gecko_id": synthetic.gecko_id(i),
+             "chainTvls": chain_tvls(i)} for i in range(synthetic.LISTING_SIZE)]
+
+def gecko_prices(params: dict) -> dict:
+    out = {}
+    for sym in filter(None, params.get("symbols", "").split(",")):
+        i = synthetic.index_of_symbol(sym)
+        if i is not None:
+            out[sym.lower()] = {"usd": synthetic.price(i)}
+    return out
+
+def llama_coin_prices(keys: str) -> dict:
+    coins = {}
+    for key in filter(None, keys.split(",")):
+        i = synthetic.index_of_gecko(key)
+        if i is not None:
+            coins[key] = {"price": synthetic.price(i), "symbol": synthetic.symbol(i), "confidence": 0.99}
+    return {"coins": coins}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive clients would
+    # see ~40 ms of delayed-ACK stall per response and drown out the configured latency.
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def send_json(self, status: int, payload=None, body: bytes | None = None, headers: dict | None = None):
+        body = body if body is not None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts  = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        api, _, path = parts.path.lstrip("/").partition("/")
+        path = "/" + path
+
+        limit = self.server.limits.get(api)
+        if limit is None:
+            return self.send_json(404, {"error": f"unknown api '{api}'"})
+        wait = limit.admit()
+        if wait:
+            return self.send_json(429, {"error": "rate limited"}, headers={"Retry-After": f"{wait:.0f}"})
+        latency = self.server.api_latency.get(api, self.server.latency)
+        if latency:
+            time.sleep(latency)
+
+        if api == "cmc" and path == "/v1/cryptocurrency/map":
+            return self.send_json(200, body=self.server.map_body)
+        if api == "cmc" and path == "/v1/cryptocurrency/quotes/latest":
+            return self.send_json(*cmc_quotes(params, self.server.tokens))
+        if api == "cmc" and path == "/v2/cryptocurrency/quotes/historical":
+            return self.send_json(200, cmc_historical(params))
+        if api == "llama" and path == "/chains":
+            return self.send_json(200, llama_chains())
+        if api == "llama" and path == "/protocols":
+            return self.send_json(200, llama_listing())
+        if api == "llama" and path.startswith("/protocol/"):
+            i = synthetic.index_of_slug(path[len("/protocol/"):])
+            if i is None:
+                return self.send_json(400, {"error": "Protocol not found"})
+            return self.send_json(200, {"slug": synthetic.slug(i), "currentChainTvls": chain_tvls(i)})
+        if api == "gecko" and path == "/api/v3/simple/price":
+            return self.send_json(200, gecko_prices(params))
+        if api == "coins" and path.startswith("/prices/current/"):
+            return self.send_json(200, llama_coin_prices(path[len("/prices/current/"):]))
+        return self.send_json(404, {"error": f"unknown endpoint {path}"})
+
+def main():
+    p = argparse.ArgumentParser(description="Serve synthetic CMC/DefiLlama responses for benchmarks.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    p.add_argument("--cmc-limit", type=int, default=0, help="CMC requests per minute before 429 (0 = unlimited)")
+    p.add_argument("--llama-limit", type=int, default=0, help="DefiLlama requests per minute before 429 (0 = unlimited)")
+    p.add_argument("--tokens", type=int, default=60000, help="Entries in the CMC map")
+    p.add_argument("--api-latency", action="append", default=[], metavar="API=SECONDS",
+                   help="Latency for one API (cmc, llama, gecko, coins), e.g. cmc=3 to exercise price hedging")
+    args = p.parse_args()
+
+    api_latency = {k: float(v) for k, _, v in (item.partition("=") for item in args.api_latency)}
+    server = MockApi((args.host, args.port), latency=args.latency, cmc_limit=args.cmc_limit,
+                     llama_limit=args.llama_limit, tokens=args.tokens, api_latency=api_latency)
+    log_ok(f"Mock API listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
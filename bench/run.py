@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR  = BENCH_DIR.parent
+
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(REPO_DIR / "scripts"))
+
+import make_workbooks
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+# Generates synthetic workbooks (make_workbooks.py), starts mock_api.py and runs each stage against
+# it, reporting wall time, request count, transferred KB and tracemalloc peak per stage. The
+# stages reach the mock through HTTP_REDIRECTS, which http_client applies after rate limiting
+# and caching, so those layers are measured too.
+CMC_HOST   = "https://pro-api.coinmarketcap.com"
+LLAMA_HOST = "https://api.llama.fi"
+GECKO_HOST = "https://api.coingecko.com"
+COINS_HOST = "https://coins.llama.fi"
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark the ONCHAIN and PERFORMANCE_TABLE stages against a local mock API.")
+    p.add_argument("--rows", default="100,1000,10000",
+                   help="Comma-separated sheet sizes to benchmark (e.g. 100,1000,10000,50000)")
+    p.add_argument("--latency", type=float, default=0.02, help="Mock server latency per request, seconds")
+    p.add_argument("--cmc-limit", type=int, default=0, help="Mock CMC requests per minute before 429 (0 = unlimited)")
+    p.add_argument("--llama-limit", type=int, default=0, help="Mock DefiLlama requests per minute before 429 (0 = unlimited)")
+    p.add_argument("--client-limit", type=int, default=100000,
+                   help="Client-side requests per minute per host (CMC_RATE_LIMIT/LLAMA_RATE_LIMIT unless already set)")
+    p.add_argument("--workers", type=int, default=8, help="Concurrent DefiLlama /protocol requests")
+    p.add_argument("--engine", choices=("protocol", "listing"), default="protocol", help="TVL engine")
+    p.add_argument("--backfill", action="store_true", help="Benchmark month-end backfill instead of the H→F copy")
+    p.add_argument("--no-trace", action="store_true", help="Skip tracemalloc (faster, no per-stage peak memory)")
+    p.add_argument("--workdir", type=Path, default=None, help="Keep generated workbooks and outputs here")
+    p.add_argument("--json", type=Path, default=None, help="Also write the results to this file")
+    p.add_argument("--verbose", action="store_true", help="Show the stages' own log output")
+    return p.parse_args()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(args, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "mock_api.py"), "--port", str(port), "--latency", str(args.latency),
+         "--cmc-limit", str(args.cmc_limit), "--llama-limit", str(args.llama_limit)],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("mock API server did not start")
+
+def configure_env(work: Path, port: int, args) -> None:
+    # Must run before the stage modules are imported: they read these at import time.
+    base = f"http://127.0.0.1:{port}"
+    os.environ["HTTP_REDIRECTS"] = (f"{CMC_HOST}={base}/cmc,{LLAMA_HOST}={base}/llama,"
+                                    f"{GECKO_HOST}={base}/gecko,{COINS_HOST}={base}/coins")
+    os.environ["HTTP_NO_CACHE"]  = "1"
+    os.environ["DOCS_DIR"]       = str(work)
+    os.environ["HISTORY_DB"]     = str(work / "history.sqlite3")
+    os.environ["API_KEY"]        = "bench"
+    os.environ.setdefault("CMC_RATE_LIMIT", str(args.client_limit))
+    os.environ.setdefault("LLAMA_RATE_LIMIT", str(args.client_limit))
+    os.environ.setdefault("COINGECKO_RATE_LIMIT", str(args.client_limit))
+    os.environ.setdefault("LLAMA_COINS_RATE_LIMIT", str(args.client_limit))
+
+class Recorder:
+    def __init__(self, trace: bool, verbose: bool):
+        self.trace   = trace
+        self.verbose = verbose
+        self.results = []
+
+    def measure(self, rows: int, name: str, fn):
+        import http_client
+
+        http_client.STATS.clear()
+        if self.trace:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, http_client.stage(name):
+            if self.verbose:
+                out = fn()
+            else:
+                with redirect_stdout(devnull):
+                    out = fn()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if self.trace else None
+
+        st = http_client.STATS.get(name, {})
+        self.results.append({
+            "rows":     rows,
+            "stage":    name,
+            "seconds":  round(seconds, 3),
+            "requests": st.get("requests", 0),
+            "kb":       round(st.get("bytes", 0) / 1024, 1),
+            "peak_mb":  round(peak / 2**20, 1) if peak is not None else None,
+        })
+        return out
+
+def bench_onchain(rec: Recorder, rows: int, path: Path, work: Path, args) -> None:
+    from openpyxl import load_workbook
+    import onchain
+    from history_store import HistoryStore
+    from stage_context import StageContext
+
+    wb  = rec.measure(rows, "onchain:load", lambda: load_workbook(str(path)))
+    ctx = StageContext(ws=wb[onchain.SHEET_NAME], docs_dir=work, api_key="bench", workers=args.workers,
+                       engine=args.engine, backfill="" if args.backfill else None)
+    ctx.shared["history"] = HistoryStore(work / f"history-{rows}.sqlite3")
+
+    for module, _, _ in onchain.STAGES:
+        rec.measure(rows, f"onchain:{module.__name__.rsplit('.', 1)[-1]}", lambda: module.run(ctx))
+    rec.measure(rows, "onchain:save", lambda: wb.save(str(work / f"onchain-{rows}-out.xlsx")))
+    ctx.history().close()
+
+def bench_performance(rec: Recorder, rows: int, path: Path, work: Path) -> None:
+    from openpyxl import load_workbook
+    import performance_table_update_prices as perf
+    from history_store import HistoryStore
+
+    wb    = rec.measure(rows, "performance:load", lambda: load_workbook(str(path)))
+    store = HistoryStore(work / f"history-perf-{rows}.sqlite3")
+    rec.measure(rows, "performance:update_prices",
+                lambda: perf.update_prices(wb[perf.SHEET_NAME], {"X-CMC_PRO_API_KEY": "bench"}, store=store))
+    rec.measure(rows, "performance:save", lambda: wb.save(str(work / f"performance-{rows}-out.xlsx")))
+    store.close()
+
+def report(results: list) -> None:
+    print(f"{'rows':>7}  {'stage':<42} {'seconds':>9} {'requests':>9} {'KB':>10} {'peak MB':>8}")
+    for r in results:
+        peak = "-" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+        print(f"{r['rows']:>7}  {r['stage']:<42} {r['seconds']:>9.3f} {r['requests']:>9} {r['kb']:>10.1f} {peak:>8}")
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 2**20 if sys.platform == "darwin" else kb / 1024
+
+def main():
+    args  = parse_args()
+    sizes = [int(s) for s in args.rows.split(",") if s.strip()]
+    work  = args.workdir or Path(tempfile.mkdtemp(prefix="onchain-bench-"))
+    work.mkdir(parents=True, exist_ok=True)
+    port  = free_port()
+
+    configure_env(work, port, args)
+    server = start_server(args, port)
+    log_info(f"Mock API on port {port}, latency {args.latency}s, working in {work}")
+
+    rec = Recorder(trace=not args.no_trace, verbose=args.verbose)
+    if rec.trace:
+        tracemalloc.start()
+    try:
+        for rows in sizes:
+            log_info(f"Generating {rows} rows…")
+            onchain_path, perf_path = make_workbooks.make_workbooks(work / str(rows), rows)
+            log_info(f"Benchmarking {rows} rows…")
+            bench_onchain(rec, rows, onchain_path, work, args)
+            bench_performance(rec, rows, perf_path, work)
+    except SystemExit as e:
+        log_err(f"A stage exited with {e.code}")
+        sys.exit(1)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report(rec.results)
+    rss = peak_rss_mb()
+    if rss is not None:
+        log_info(f"Peak RSS {rss:.1f} MB")
+    if args.json:
+        args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()},
+                                         "peak_rss_mb": rss, "results": rec.results}, indent=2))
+        log_ok(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
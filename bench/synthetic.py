@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import re
+
+# The synthetic asset universe shared by make_workbooks.py and mock_api.py. Row i of a
+# generated sheet refers to token i; every value is a pure function of the index so the
+# mock server can answer any request without keeping state.
+
+CHAINS       = 200
+LISTING_SIZE = 5000
+CHAIN_EVERY  = 5        # every 5th ONCHAIN row is a chain instead of a protocol
+
+_SYMBOL = re.compile(r"TK(\d+)")
+_SLUG   = re.compile(r"proto-(\d+)")
+_GECKO  = re.compile(r"(?:coingecko:)?gecko-(\d+)")
+
+def symbol(i: int) -> str:
+    return f"TK{i}"
+
+def name(i: int) -> str:
+    return f"Token {i}"
+
+def cmc_id(i: int) -> int:
+    return i + 1
+
+def slug(i: int) -> str:
+    return f"proto-{i}"
+
+def gecko_id(i: int) -> str:
+    return f"gecko-{i}"
+
+def chain_name(j: int) -> str:
+    return f"Chain{j}"
+
+def chain_symbol(j: int) -> str:
+    return f"CH{j}"
+
+def price(i: int) -> float:
+    return round(0.0005 + (i * 2654435761 % 10**6) / 1000, 6)
+
+def tvl(i: int) -> float:
+    return float((i * 40503 % 10**5 + 1) * 1000)
+
+def index_of_symbol(text: str) -> int | None:
+    m = _SYMBOL.fullmatch(str(text).upper())
+    return int(m.group(1)) if m else None
+
+def index_of_slug(text: str) -> int | None:
+    m = _SLUG.fullmatch(str(text).lower())
+    return int(m.group(1)) if m else None
+
+def index_of_gecko(text: str) -> int | None:
+    m = _GECKO.fullmatch(str(text).lower())
+    return int(m.group(1)) if m else None
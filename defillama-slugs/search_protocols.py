@@ -1,37 +1,239 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
 import json
+import os
+import re
 import sys
+import time
+from bisect import bisect_left
+from collections import Counter
 from pathlib import Path
 
-def find_clearpool_entries(protocols):
-    results = []
-    for p in protocols:
-        slug = p.get("slug", "").lower()
-        name = p.get("name", "").lower()
-        if "clearpool" in slug or "clearpool" in name:
-            results.append(p)
-    return results
+HERE       = Path(__file__).resolve().parent
+SCRIPTS    = HERE.parent / "scripts"
+JSON_PATH  = HERE / "protocols.json"
+INDEX_PATH = HERE / ".protocols.index.json"
+
+LISTING_URL   = "https://api.llama.fi/protocols"
+INDEX_VERSION = 2
+MIN_OVERLAP   = 0.5     # share of the query's trigrams a candidate must contain
+
+def compact(text) -> str:
+    return re.sub(r"[^a-z0-9]+", "", str(text or "").lower())
+
+def tokens(text) -> list:
+    return re.findall(r"[a-z0-9]+", str(text or "").lower())
+
+def trigrams(word: str) -> set:
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProtocolIndex:
+    # Trigram postings over the compacted name/slug/symbol of each protocol, a sorted token
+    # list for prefix lookups of short queries, and chain -> protocol ids for chain filters.
+    def __init__(self, protocols: list, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.docs     = []
+        self.grams    = {}
+        self.words    = {}
+        self.chains   = {}
+
+        for p in protocols:
+            if not p.get("slug"):
+                continue
+            i = len(self.docs)
+            doc = {
+                "name":     p.get("name") or "",
+                "slug":     p.get("slug") or "",
+                "symbol":   p.get("symbol") if p.get("symbol") not in (None, "-") else "",
+                "chains":   list(p.get("chains") or []),
+                "category": p.get("category") or "",
+                "tvl":      p.get("tvl") or 0,
+            }
+            self.docs.append(doc)
+
+            for field in ("name", "slug", "symbol"):
+                key = compact(doc[field])
+                if key:
+                    for g in trigrams(key):
+                        self.grams.setdefault(g, set()).add(i)
+                for word in tokens(doc[field]):
+                    self.words.setdefault(word, set()).add(i)
+            for chain in doc["chains"]:
+                self.chains.setdefault(compact(chain), set()).add(i)
+
+        self.sorted_words = sorted(self.words)
+
+    def to_json(self) -> dict:
+        return {"fingerprint": list(self.fingerprint), "docs": self.docs,
+                "grams":  {g: sorted(ids) for g, ids in self.grams.items()},
+                "words":  {w: sorted(ids) for w, ids in self.words.items()},
+                "chains": {c: sorted(ids) for c, ids in self.chains.items()}}
+
+    @classmethod
+    def from_json(cls, state: dict) -> "ProtocolIndex":
+        index = cls.__new__(cls)
+        index.fingerprint  = tuple(state["fingerprint"])
+        index.docs         = state["docs"]
+        index.grams        = {g: set(ids) for g, ids in state["grams"].items()}
+        index.words        = {w: set(ids) for w, ids in state["words"].items()}
+        index.chains       = {c: set(ids) for c, ids in state["chains"].items()}
+        index.sorted_words = sorted(index.words)
+        return index
+
+    def _prefix(self, prefix: str) -> set:
+        out = set()
+        for word in self.sorted_words[bisect_left(self.sorted_words, prefix):]:
+            if not word.startswith(prefix):
+                break
+            out |= self.words[word]
+        return out
+
+    def _candidates(self, key: str) -> set:
+        if len(key) < 3:
+            return self._prefix(key)
+        query = trigrams(key)
+        counts = Counter()
+        for g in query:
+            counts.update(self.grams.get(g, ()))
+        need = max(1, int(len(query) * MIN_OVERLAP))
+        return {i for i, n in counts.items() if n >= need} | self._prefix(key)
+
+    def _score(self, i: int, key: str) -> float:
+        doc  = self.docs[i]
+        best = 0.0
+        for field, weight in (("slug", 1.0), ("name", 1.0), ("symbol", 0.9)):
+            value = compact(doc[field])
+            if not value:
+                continue
+            if value == key:
+                score = 3.0
+            elif value.startswith(key):
+                score = 2.5
+            elif key in value:
+                score = 1.5
+            else:
+                a, b = trigrams(key), trigrams(value)
+                score = len(a & b) / len(a | b)
+            best = max(best, score * weight)
+        return best
+
+    def search(self, query: str, limit: int = 10, chain: str | None = None) -> list:
+        key = compact(query)
+        if not key:
+            return []
+        ids = self._candidates(key)
+        if chain:
+            ids &= self.chains.get(compact(chain), set())
+        scored = sorted(((self._score(i, key), i) for i in ids), key=lambda s: (-s[0], -(self.docs[s[1]]["tvl"] or 0)))
+        return [(round(score, 3), self.docs[i]) for score, i in scored[:limit]]
+
+def fingerprint(path: Path) -> tuple:
+    st = path.stat()
+    return (INDEX_VERSION, st.st_size, st.st_mtime_ns)
+
+def load_index(json_path: Path = JSON_PATH, index_path: Path = INDEX_PATH, rebuild: bool = False) -> ProtocolIndex:
+    # The saved index (plain JSON) is reused until protocols.json changes (size or mtime).
+    fp = fingerprint(json_path)
+    if not rebuild and index_path.exists():
+        try:
+            state = json.loads(index_path.read_text(encoding="utf-8"))
+            if tuple(state.get("fingerprint") or ()) == fp:
+                return ProtocolIndex.from_json(state)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    protocols = json.loads(json_path.read_text(encoding="utf-8"))
+    index = ProtocolIndex(protocols, fingerprint=fp)
+    tmp = index_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index.to_json(), separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, index_path)
+    print(f"ℹ️  Indexed {len(index.docs)} protocols from {json_path.name}", file=sys.stderr)
+    return index
+
+def download_protocols(json_path: Path) -> None:
+    sys.path.insert(0, str(SCRIPTS))
+    from http_cache import CACHE
+
+    protocols = CACHE.get_json(LISTING_URL)
+    json_path.write_text(json.dumps(protocols), encoding="utf-8")
+    print(f"✅ Saved {len(protocols)} protocols to {json_path}", file=sys.stderr)
+
+def print_matches(matches: list, as_json: bool) -> None:
+    if as_json:
+        print(json.dumps([{"score": s, **doc} for s, doc in matches], indent=2))
+        return
+    for score, doc in matches:
+        chains = ", ".join(doc["chains"][:4]) + (" …" if len(doc["chains"]) > 4 else "")
+        print(f"{score:5.2f}  {doc['slug']:<32} {doc['name']:<32} {doc['symbol'] or '-':<8} "
+              f"${doc['tvl'] or 0:>16,.0f}  {chains}")
+
+def suggest_for_workbook(index: ProtocolIndex, path: Path, limit: int) -> None:
+    # ONCHAIN rows with an empty slug (column D) that are not chains get the top matches for
+    # their name, then their ticker.
+    sys.path.insert(0, str(SCRIPTS))
+    from sheet_rows import read_rows, is_blank
+
+    rows = read_rows(path, "ONCHAIN", 4, ("B", "C", "D", "E"), is_empty=lambda r: is_blank(r[2]))
+    todo = [r for r in rows if is_blank(r.D) and str(r.E or "").strip().lower() != "chain"
+            and str(r.C).strip().upper() != "SYMBOLS"]
+    if not todo:
+        print("✅ Every ONCHAIN row already has a slug")
+        return
+
+    for r in todo:
+        seen, matches = set(), []
+        for query in (r.B, r.C):
+            for score, doc in index.search(str(query or ""), limit=limit):
+                if doc["slug"] not in seen:
+                    seen.add(doc["slug"])
+                    matches.append((score, doc))
+        print(f"Row {r.row}: {r.B or ''} ({r.C})")
+        print_matches(sorted(matches, key=lambda m: -m[0])[:limit], as_json=False)
+        print("-" * 80)
 
 def main():
-    json_path = Path(__file__).parent / "protocols.json"
-    if not json_path.exists():
-        print(f"❌ File not found: {json_path}", file=sys.stderr)
+    p = argparse.ArgumentParser(description="Search DefiLlama protocols by name, slug, symbol or chain.")
+    p.add_argument("query", nargs="*", help="Search text (e.g. clearpool, 'aave v3', GMX)")
+    p.add_argument("--chain", help="Only protocols deployed on this chain")
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--json", action="store_true", help="Print full JSON entries")
+    p.add_argument("--suggest", type=Path, metavar="XLSX",
+                   help="Suggest slugs for ONCHAIN rows whose column D is empty")
+    p.add_argument("--download", action="store_true", help="Refresh protocols.json from DefiLlama /protocols")
+    p.add_argument("--rebuild", action="store_true", help="Rebuild the index even if protocols.json is unchanged")
+    p.add_argument("--protocols", type=Path, default=JSON_PATH, help="Path to protocols.json")
+    args = p.parse_args()
+
+    if args.download:
+        download_protocols(args.protocols)
+    if not args.protocols.exists():
+        print(f"❌ File not found: {args.protocols} (run with --download)", file=sys.stderr)
         sys.exit(1)
 
     try:
-        protocols = json.loads(json_path.read_text(encoding="utf-8"))
+        start = time.perf_counter()
+        index = load_index(args.protocols, args.protocols.parent / INDEX_PATH.name, rebuild=args.rebuild)
     except json.JSONDecodeError as e:
         print(f"❌ Failed to parse JSON: {e}", file=sys.stderr)
         sys.exit(1)
 
-    matches = find_clearpool_entries(protocols)
+    if args.suggest:
+        suggest_for_workbook(index, args.suggest, args.limit)
+        return
+    if not args.query:
+        p.error("a query or --suggest is required")
+
+    matches = index.search(" ".join(args.query), limit=args.limit, chain=args.chain)
+    elapsed = (time.perf_counter() - start) * 1000
     if not matches:
-        print("⚠️  No entries matching 'clearpool' found in protocols.json", file=sys.stderr)
+        print(f"⚠️  No protocols matching '{' '.join(args.query)}'", file=sys.stderr)
         sys.exit(1)
 
-    for entry in matches:
-        print(json.dumps(entry, indent=2))
-        print("-" * 80)
+    print_matches(matches, args.json)
+    print(f"ℹ️  {len(matches)} match(es) in {elapsed:.1f} ms", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
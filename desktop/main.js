@@ -74,6 +74,41 @@ function resolveWorker(name) {
       : null;
 }
 
+const EVENT_PREFIX = "@@EVENT ";
+
+// Python workers interleave "@@EVENT {json}" lines (scripts/events.py) with the
+// human log; forward those as py:<id>:event and everything else as stdout.
+function routeStdout(child, sender, ch) {
+  let pending = "";
+  const flush = (text) => {
+    const log = [];
+    for (const line of text.split("\n")) {
+      if (!line.startsWith(EVENT_PREFIX)) {
+        log.push(line);
+        continue;
+      }
+      try {
+        sender.send(ch("event"), JSON.parse(line.slice(EVENT_PREFIX.length)));
+      } catch {
+        log.push(line);
+      }
+    }
+    const out = log.join("\n");
+    if (out.trim()) sender.send(ch("stdout"), out);
+  };
+  child.stdout.on("data", (d) => {
+    pending += d.toString();
+    const cut = pending.lastIndexOf("\n");
+    if (cut < 0) return;
+    flush(pending.slice(0, cut + 1));
+    pending = pending.slice(cut + 1);
+  });
+  child.stdout.on("end", () => {
+    if (pending) flush(pending);
+    pending = "";
+  });
+}
+
 function runWorkerStream({ name, args = [], cwd, env = {}, sender, id }) {
   const exe = resolveWorker(name);
   if (!exe) throw new Error(`Worker not found ${name}`);
@@ -84,7 +119,7 @@ function runWorkerStream({ name, args = [], cwd, env = {}, sender, id }) {
   running.set(id, child);
   const ch = (t) => `py:${id}:${t}`;
   sender.send(ch("start"), { pid: child.pid });
-  child.stdout.on("data", (d) => sender.send(ch("stdout"), d.toString()));
+  routeStdout(child, sender, ch);
   child.stderr.on("data", (d) => sender.send(ch("stderr"), d.toString()));
   return new Promise((resolve, reject) => {
     child.on("close", (code) => {
@@ -96,6 +131,112 @@ function runWorkerStream({ name, args = [], cwd, env = {}, sender, id }) {
   });
 }
 
+// Long-lived Python worker (worker.py, or the pipeline_worker binary when packaged),
+// started once and driven over newline-delimited JSON-RPC on stdin/stdout. It keeps
+// HTTP pools, caches and reference data warm between runs. A Stop kills it; the
+// next run starts a new one.
+let pyWorker = null;
+
+function resolvePythonWorker() {
+  if (process.env.NO_PY_WORKER) return null;
+  const exe = resolveWorker("pipeline_worker");
+  if (exe) return { cmd: exe, args: [] };
+  // Packaged build without the worker binary: keep using the one-shot updaters.
+  if (resolveWorker("monthly_updater")) return null;
+  const script = path.join(projectRoot, "worker.py");
+  if (!fs.existsSync(script)) return null;
+  return { cmd: getPythonCmd(), args: ["-u", script] };
+}
+
+function startPythonWorker() {
+  const spec = resolvePythonWorker();
+  if (!spec) return null;
+  const child = spawn(spec.cmd, spec.args, {
+    cwd: projectRoot,
+    env: {
+      ...process.env,
+      APP_BASE: projectRoot,
+      DOCS_DIR: docsDir,
+      PYTHONUTF8: "1",
+      PYTHONIOENCODING: "utf-8",
+      PYTHONUNBUFFERED: "1",
+    },
+  });
+  const w = { child, nextId: 1, pending: new Map(), buffer: "" };
+
+  child.stdout.on("data", (d) => {
+    w.buffer += d.toString();
+    const lines = w.buffer.split("\n");
+    w.buffer = lines.pop();
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      try {
+        onWorkerMessage(w, JSON.parse(line));
+      } catch {}
+    }
+  });
+  child.stderr.on("data", (d) => {
+    for (const call of w.pending.values()) {
+      if (call.channel) call.sender.send(`py:${call.channel}:stderr`, d.toString());
+    }
+  });
+  const fail = (err) => {
+    for (const call of w.pending.values()) call.reject(err);
+    w.pending.clear();
+    if (pyWorker === w) pyWorker = null;
+  };
+  child.on("error", fail);
+  child.on("close", (code) => fail(new Error(`worker exited with code ${code}`)));
+
+  pyWorker = w;
+  return w;
+}
+
+function onWorkerMessage(w, msg) {
+  if (msg.id != null && w.pending.has(msg.id)) {
+    const call = w.pending.get(msg.id);
+    w.pending.delete(msg.id);
+    if (msg.error) call.reject(new Error(msg.error.message));
+    else call.resolve(msg.result);
+    return;
+  }
+  const call = msg.params && w.pending.get(msg.params.run);
+  if (!call || !call.channel) return;
+  if (msg.method === "log") {
+    call.sender.send(`py:${call.channel}:stdout`, `${msg.params.line}\n`);
+  } else if (msg.method === "event") {
+    const { run, ...event } = msg.params;
+    call.sender.send(`py:${call.channel}:event`, event);
+  }
+}
+
+function callWorker(w, method, params, route = {}) {
+  return new Promise((resolve, reject) => {
+    const id = w.nextId++;
+    w.pending.set(id, { ...route, resolve, reject });
+    w.child.stdin.write(
+      JSON.stringify({ jsonrpc: "2.0", id, method, params }) + "\n"
+    );
+  });
+}
+
+async function runInWorker({ command, args = [], env = {}, sender, id }) {
+  const w = pyWorker || startPythonWorker();
+  if (!w) throw new Error("Python worker not available");
+  running.set(id, w.child);
+  const ch = (t) => `py:${id}:${t}`;
+  sender.send(ch("start"), { pid: w.child.pid });
+  try {
+    await callWorker(w, "run", { command, args, env }, { sender, channel: id });
+    sender.send(ch("exit"), 0);
+  } catch (e) {
+    sender.send(ch("exit"), 1);
+    throw e;
+  } finally {
+    running.delete(id);
+  }
+}
+
 function terminateProcess(child) {
   return new Promise((resolve) => {
     const done = () => resolve();
@@ -166,7 +307,20 @@ async function handleRunWeekly(event, payload) {
   await ensureDocsInputs({ weeklyPath });
 
   const exe = resolveWorker("weekly_updater");
-  if (exe) {
+  if (pyWorker || resolvePythonWorker()) {
+    await runInWorker({
+      command: "weekly",
+      args: [
+        "--input",
+        path.join(docsDir, "Weekly_Performance_PORTFOLIO.xlsx"),
+        "--output",
+        path.join(docsDir, "Weekly_Performance_PORTFOLIO_latest.xlsx"),
+      ],
+      env: { API_KEY: apiKey },
+      sender: event.sender,
+      id: "weekly",
+    });
+  } else if (exe) {
     await runWorkerStream({
       name: "weekly_updater",
       cwd: scriptsDir,
@@ -176,7 +330,12 @@ async function handleRunWeekly(event, payload) {
         "--output",
         path.join(docsDir, "Weekly_Performance_PORTFOLIO_latest.xlsx"),
       ],
-      env: { APP_BASE: projectRoot, DOCS_DIR: docsDir, API_KEY: apiKey },
+      env: {
+        APP_BASE: projectRoot,
+        DOCS_DIR: docsDir,
+        API_KEY: apiKey,
+        PROGRESS_EVENTS: "stdout",
+      },
       sender: event.sender,
       id: "weekly",
     });
@@ -194,7 +353,12 @@ async function handleRunWeekly(event, payload) {
         "--output",
         path.join(docsDir, "Weekly_Performance_PORTFOLIO_latest.xlsx"),
       ],
-      env: { APP_BASE: projectRoot, DOCS_DIR: docsDir, API_KEY: apiKey },
+      env: {
+        APP_BASE: projectRoot,
+        DOCS_DIR: docsDir,
+        API_KEY: apiKey,
+        PROGRESS_EVENTS: "stdout",
+      },
       sender: event.sender,
       id: "weekly",
     });
@@ -217,7 +381,20 @@ async function handleRunOnchain(event, payload) {
   await ensureDocsInputs({ monthlyPath });
 
   const exe = resolveWorker("monthly_updater");
-  if (exe) {
+  if (pyWorker || resolvePythonWorker()) {
+    await runInWorker({
+      command: "monthly",
+      args: [
+        "--input",
+        path.join(docsDir, "Monthly_Performance_CVR.xlsx"),
+        "--output",
+        path.join(docsDir, "Monthly_Performance_CVR_latest.xlsx"),
+      ],
+      env: { API_KEY: apiKey },
+      sender: event.sender,
+      id: "monthly",
+    });
+  } else if (exe) {
     await runWorkerStream({
       name: "monthly_updater",
       cwd: projectRoot,
@@ -227,7 +404,12 @@ async function handleRunOnchain(event, payload) {
         "--output",
         path.join(docsDir, "Monthly_Performance_CVR_latest.xlsx"),
       ],
-      env: { APP_BASE: projectRoot, DOCS_DIR: docsDir, API_KEY: apiKey },
+      env: {
+        APP_BASE: projectRoot,
+        DOCS_DIR: docsDir,
+        API_KEY: apiKey,
+        PROGRESS_EVENTS: "stdout",
+      },
       sender: event.sender,
       id: "monthly",
     });
@@ -242,7 +424,12 @@ async function handleRunOnchain(event, payload) {
         "--output",
         path.join(docsDir, "Monthly_Performance_CVR_latest.xlsx"),
       ],
-      env: { APP_BASE: projectRoot, DOCS_DIR: docsDir, API_KEY: apiKey },
+      env: {
+        APP_BASE: projectRoot,
+        DOCS_DIR: docsDir,
+        API_KEY: apiKey,
+        PROGRESS_EVENTS: "stdout",
+      },
       sender: event.sender,
       id: "monthly",
     });
@@ -281,7 +468,7 @@ function runPythonStream({ entry, args = [], cwd, env = {}, sender, id }) {
   running.set(id, child);
   const ch = (t) => `py:${id}:${t}`;
   sender.send(ch("start"), { pid: child.pid });
-  child.stdout.on("data", (d) => sender.send(ch("stdout"), d.toString()));
+  routeStdout(child, sender, ch);
   child.stderr.on("data", (d) => sender.send(ch("stderr"), d.toString()));
   return new Promise((resolve, reject) => {
     child.on("close", (code) => {
@@ -346,12 +533,20 @@ app.whenReady().then(() => {
     return { ok: true };
   });
 
+  try {
+    startPythonWorker();
+  } catch {}
+
   createWindow();
   app.on("activate", () => {
     if (BrowserWindow.getAllWindows().length === 0) createWindow();
   });
 });
 
+app.on("before-quit", () => {
+  if (pyWorker) pyWorker.child.stdin.end();
+});
+
 app.on("window-all-closed", () => {
   if (process.platform !== "darwin") app.quit();
 });
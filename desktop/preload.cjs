@@ -16,9 +16,11 @@ contextBridge.exposeInMainWorld("api", {
   onWeeklyStdout: (cb) => sub("py:weekly:stdout", cb),
   onWeeklyStderr: (cb) => sub("py:weekly:stderr", cb),
   onWeeklyExit: (cb) => sub("py:weekly:exit", cb),
+  onWeeklyEvent: (cb) => sub("py:weekly:event", cb),
   onOnchainStdout: (cb) => sub("py:monthly:stdout", cb),
   onOnchainStderr: (cb) => sub("py:monthly:stderr", cb),
   onOnchainExit: (cb) => sub("py:monthly:exit", cb),
+  onOnchainEvent: (cb) => sub("py:monthly:event", cb),
 
   onWeeklyStopping: (cb) => sub("py:weekly:stopping", cb),
   onOnchainStopping: (cb) => sub("py:monthly:stopping", cb),
@@ -43,4 +43,9 @@ if (fs.existsSync(onchainSrc)) {
   fs.copyFileSync(onchainSrc, path.join(appdata, "onchain.py"));
 }
 
+const workerSrc = path.join(repoRoot, "worker.py");
+if (fs.existsSync(workerSrc)) {
+  fs.copyFileSync(workerSrc, path.join(appdata, "worker.py"));
+}
+
 console.log("[prepare-appdata] Copied scripts/docs into desktop/appdata");
@@ -4,6 +4,7 @@ let state = {
   weeklyPath: "",
   monthlyPath: "",
   running: false,
+  progress: null,
 };
 
 const $ = (sel) => document.querySelector(sel);
@@ -242,10 +243,52 @@ function addLog(type, chunk) {
   wrap.scrollTop = wrap.scrollHeight;
 }
 
+function formatDuration(seconds) {
+  const s = Math.max(0, Math.round(seconds));
+  if (s < 60) return `${s}s`;
+  const m = Math.floor(s / 60);
+  return m < 60 ? `${m}m ${s % 60}s` : `${Math.floor(m / 60)}h ${m % 60}m`;
+}
+
+function stageLabel(stage) {
+  return String(stage || "")
+    .replace(/^onchain_/, "")
+    .replace(/_/g, " ");
+}
+
+// JSON events from scripts/events.py: stage_start/stage_end, rows_total/rows_done,
+// request, rate_limit_wait, file_written. Only the progress ones drive the UI.
+function handleEvent(ev) {
+  if (!ev || !state.running) return;
+  if (ev.event === "stage_start") {
+    state.progress = { stage: ev.stage, started: Date.now(), total: 0, unit: "" };
+    setStatus(`${stageLabel(ev.stage)}…`);
+  } else if (ev.event === "rows_total" && state.progress) {
+    Object.assign(state.progress, {
+      started: Date.now(),
+      total: ev.total,
+      unit: ev.unit,
+    });
+  } else if (ev.event === "rows_done" && state.progress && ev.total) {
+    const p = state.progress;
+    const elapsed = (Date.now() - p.started) / 1000;
+    const pct = Math.floor((100 * ev.done) / ev.total);
+    let text = `${stageLabel(p.stage)} ${ev.done}/${ev.total} ${ev.unit} (${pct}%)`;
+    if (ev.done > 0 && ev.done < ev.total && elapsed > 1) {
+      text += ` · ETA ${formatDuration(((ev.total - ev.done) * elapsed) / ev.done)}`;
+    }
+    setStatus(text);
+  } else if (ev.event === "stage_end") {
+    setStatus(`${stageLabel(ev.stage)} done in ${formatDuration(ev.seconds)}`);
+    state.progress = null;
+  }
+}
+
 function wireLiveLogs() {
   if (window.api.onWeeklyStdout) {
     window.api.onWeeklyStdout((s) => addLog("out", s));
     window.api.onWeeklyStderr((s) => addLog("err", s));
+    if (window.api.onWeeklyEvent) window.api.onWeeklyEvent(handleEvent);
     window.api.onWeeklyExit((code) => {
       hideStop();
       updateRunStatus(code === 0 ? "ok" : "err");
@@ -257,6 +300,7 @@ function wireLiveLogs() {
   if (window.api.onOnchainStdout) {
     window.api.onOnchainStdout((s) => addLog("out", s));
     window.api.onOnchainStderr((s) => addLog("err", s));
+    if (window.api.onOnchainEvent) window.api.onOnchainEvent(handleEvent);
     window.api.onOnchainExit((code) => {
       hideStop();
       updateRunStatus(code === 0 ? "ok" : "err");
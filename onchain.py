@@ -1,7 +1,6 @@
 import os
 import sys
-import time
-import runpy
+import argparse
 from pathlib import Path
 
 BASE = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent))
@@ -9,42 +8,139 @@ BASE = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent))
 sys.path.insert(0, str(BASE))
 sys.path.insert(0, str(BASE / 'scripts'))
 
-import scripts.onchain_rewrite_prices  
-import scripts.onchain_update_prices   
-import scripts.onchain_update_tvl      
-import scripts.onchain_sort_by_tvl     
-import scripts.clean_up
+from openpyxl import load_workbook
+
+import http_client
+import events
+import price_providers
+from http_cache import CACHE
+from stage_context import StageContext
+from history_store import parse_age
+from profiling import Profiler
+from scripts import (
+    onchain_rewrite_prices,
+    onchain_update_prices,
+    onchain_update_tvl,
+    onchain_sort_by_tvl,
+    clean_up,
+)
 
 def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
 def log_info(msg): print(f"[INFO] {msg}", flush=True)
 def log_warn(msg): print(f"[WARN] {msg}", flush=True)
 def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
 
-SCRIPT_DELAY = 5
+APP_BASE = Path(os.environ.get("APP_BASE", Path(__file__).resolve().parent)).resolve()
+DOCS_DIR = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+
+INPUT_FILE  = DOCS_DIR / "Monthly_Performance_CVR.xlsx"
+OUTPUT_FILE = DOCS_DIR / "Weekly_Performance_updated.xlsx"
+SHEET_NAME  = "ONCHAIN"
+
+PROFILER = Profiler(root=DOCS_DIR / "profiles", name="onchain")
 
-MODULES = [
-    ("scripts.onchain_rewrite_prices", "Rewriting prices..."),
-    ("scripts.onchain_update_prices",  "Updating prices..."),
-    ("scripts.onchain_update_tvl",     "Updating TVL..."),
-    ("scripts.onchain_sort_by_tvl",    "Sorting rows by TVL..."),
-    ("scripts.clean_up",               "Cleaning up..."),
+# (module, message, debug snapshot file). Every module exposes run(ctx) for the
+# in-memory pipeline and main() for the legacy file-chained mode.
+STAGES = [
+    (onchain_rewrite_prices, "Rewriting prices...",    "updated_file.xlsx"),
+    (onchain_update_prices,  "Updating prices...",     "updated_prices.xlsx"),
+    (onchain_update_tvl,     "Updating TVL...",        "updated_tvl.xlsx"),
+    (onchain_sort_by_tvl,    "Sorting rows by TVL...", None),
 ]
 
+def run_legacy():
+    for module, message, _ in STAGES + [(clean_up, "Cleaning up...", None)]:
+        log_info(message)
+        name = module.__name__.rsplit(".", 1)[-1]
+        with http_client.stage(name), PROFILER.stage(name):
+            module.main()
+
+def run_pipeline(args, ctx=None):
+    if not args.input.exists():
+        log_err(f"Input file not found")
+        sys.exit(1)
+
+    try:
+        with PROFILER.stage("load_workbook"):
+            wb = load_workbook(str(args.input))
+    except Exception as e:
+        log_err(f"Failed to open workbook: {e}")
+        sys.exit(1)
+
+    if SHEET_NAME not in wb.sheetnames:
+        log_err(f"Sheet '{SHEET_NAME}' not found")
+        sys.exit(1)
+
+    ctx = ctx or StageContext(docs_dir=DOCS_DIR)
+    ctx.ws      = wb[SHEET_NAME]
+    ctx.workers = args.workers
+    ctx.engine  = args.engine
+    ctx.max_age = args.max_age
+    ctx.backfill = args.backfill
+
+    for module, message, snapshot in STAGES:
+        log_info(message)
+        name = module.__name__.rsplit(".", 1)[-1]
+        with http_client.stage(name), PROFILER.stage(name):
+            module.run(ctx)
+        if args.snapshots and snapshot:
+            wb.save(str(DOCS_DIR / snapshot))
+            events.file_written(DOCS_DIR / snapshot)
+            log_info(f"Saved snapshot {snapshot}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with PROFILER.stage("save_workbook"):
+        wb.save(str(args.output))
+    events.file_written(args.output)
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Run the monthly ONCHAIN update.")
+    p.add_argument("--input",  type=Path, default=INPUT_FILE, help="Path to input Monthly_Performance_CVR.xlsx")
+    p.add_argument("--output", type=Path, default=OUTPUT_FILE, help="Path to output workbook")
+    p.add_argument("--legacy", action="store_true",
+                   help="Run each stage as a separate script chained through intermediate files in docs/")
+    p.add_argument("--snapshots", action="store_true",
+                   help="Save the workbook after each stage (updated_file/updated_prices/updated_tvl.xlsx)")
+    p.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP response cache")
+    p.add_argument("--workers", type=int, default=onchain_update_tvl.WORKERS, help="Concurrent DefiLlama /protocol requests")
+    p.add_argument("--engine", choices=("protocol", "listing"), default=onchain_update_tvl.ENGINE, help="TVL engine")
+    p.add_argument("--backfill", nargs="?", const="", default=None, metavar="YYYY-MM",
+                   help="Fill the monthly price column with month-end closes (default month: the previous one)")
+    p.add_argument("--max-age", type=parse_age, default=None,
+                   help="Reuse prices/TVL from the local history store newer than this (e.g. 900, 15m, 2h)")
+    price_providers.add_arguments(p)
+    http_client.add_arguments(p)
+    events.add_arguments(p)
+    p.add_argument("--profile", action="store_true",
+                   help="Write per-stage cProfile dumps and a memory report to docs/profiles/")
+    return p.parse_args(argv)
+
+def run(args, ctx=None):
+    CACHE.enabled = CACHE.enabled and not args.no_cache
+    http_client.configure_from_args(args)
+    events.configure(args.events)
+    price_providers.configure_from_args(args)
+    PROFILER.enabled = args.profile
+    try:
+        if args.legacy:
+            run_legacy()
+        else:
+            run_pipeline(args, ctx)
+    finally:
+        PROFILER.write_report()
+
 def main():
-    for i, (mod_name, message) in enumerate(MODULES):
-        if message:
-            log_info(message)
-        try:
-            runpy.run_module(mod_name, run_name="__main__")
-        except SystemExit as e:
-            code = e.code if isinstance(e.code, int) else 1
-            log_err(f"Failed with {code}")
-            sys.exit(code)
-        except Exception as e:
-            log_err(f"Failed with {e}")
-            sys.exit(1)
-        if i < len(MODULES) - 1:
-            time.sleep(SCRIPT_DELAY)
+    args = parse_args()
+    try:
+        run(args)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+        log_err(f"Failed with {code}")
+        sys.exit(code)
+    except Exception as e:
+        log_err(f"Failed with {e}")
+        sys.exit(1)
+    http_client.log_stats()
     log_ok("All onchain scripts completed successfully.")
 
 if __name__ == "__main__":
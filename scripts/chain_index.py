@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from http_cache import CACHE
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
+DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+SLUGS_DIR  = Path(os.environ.get("SLUGS_DIR", APP_BASE / "defillama-slugs")).resolve()
+
+CHAINS_FILE  = SLUGS_DIR / "chains.json"
+SYMBOLS_FILE = SLUGS_DIR / "defillama_symbol_to_slug.json"
+INDEX_PATH   = DOCS_DIR / ".cache" / "chain_index.json"
+INDEX_TTL    = int(os.environ.get("CHAIN_INDEX_TTL", str(24 * 3600)))
+
+LLAMA_CHAINS_URL = "https://api.llama.fi/chains"
+
+# Chain alias index: name, ticker, gecko_id, cmcId, chainId and the defillama_symbol_to_slug.json
+# tickers all resolve to one chain. Built from the bundled defillama-slugs files so chain rows
+# resolve offline, and persisted under docs/.cache.
+#
+# Identity fields kept per chain; tvl is deliberately dropped, numbers always come from /chains.
+FIELDS = ("name", "tokenSymbol", "gecko_id", "cmcId", "chainId")
+
+def normalize(value) -> str:
+    return re.sub(r"[^A-Z0-9]", "", str(value).upper()) if value not in (None, "") else ""
+
+def build(chains: list, symbol_to_slug: dict) -> dict:
+    # aliases: normalized name / ticker / gecko_id / cmcId / chainId -> normalized chain name.
+    # Earlier kinds win on collisions, so a chain's own name beats another chain's ticker.
+    entries = {}
+    for c in chains:
+        key = normalize(c.get("name"))
+        if key:
+            entries.setdefault(key, {f: c.get(f) for f in FIELDS})
+
+    aliases = {}
+    for field in FIELDS:
+        for key, entry in entries.items():
+            alias = normalize(entry.get(field))
+            if alias:
+                aliases.setdefault(alias, key)
+    for symbol, slug in symbol_to_slug.items():
+        target = aliases.get(normalize(slug))
+        if target:
+            aliases.setdefault(normalize(symbol), target)
+
+    return {"built": time.time(), "chains": entries, "aliases": aliases}
+
+def _read_json(path: Path, default):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return default
+
+def _save(index: dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A temp file per writer: batch workers may rebuild the index at the same time.
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=f".{path.name}.",
+                                     suffix=".tmp", delete=False) as f:
+        f.write(json.dumps(index))
+    os.replace(f.name, path)
+
+class ChainIndex:
+    def __init__(self, data: dict):
+        self.built   = data.get("built", 0)
+        self.chains  = data.get("chains", {})
+        self.aliases = data.get("aliases", {})
+
+    def resolve(self, *values) -> str | None:
+        # First of values that names a known chain, as its normalized chain name.
+        for v in values:
+            key = self.aliases.get(normalize(v))
+            if key:
+                return key
+        return None
+
+    def entry(self, key: str) -> dict | None:
+        return self.chains.get(key)
+
+def refresh(path: Path = INDEX_PATH) -> ChainIndex:
+    chains  = CACHE.get_json(LLAMA_CHAINS_URL)
+    symbols = _read_json(SYMBOLS_FILE, {})
+    data = build(chains, symbols)
+    _save(data, path)
+    return ChainIndex(data)
+
+def _refresh_quietly(path: Path) -> None:
+    try:
+        refresh(path)
+    except Exception as e:
+        log_warn(f"Chain index refresh failed: {e}")
+
+_refreshing = threading.Lock()
+
+def load(path: Path = INDEX_PATH, ttl: int = INDEX_TTL) -> ChainIndex:
+    # Served from the persisted index; built from the bundled defillama-slugs files when missing
+    # or older than them, and refreshed from /chains on a background thread once past its TTL.
+    data = _read_json(path, None)
+    sources = [p.stat().st_mtime for p in (CHAINS_FILE, SYMBOLS_FILE) if p.exists()]
+    if not data or (sources and data.get("built", 0) < max(sources)):
+        data = build(_read_json(CHAINS_FILE, []), _read_json(SYMBOLS_FILE, {}))
+        if not data["chains"]:
+            data["built"] = 0       # bundled files missing or empty: refresh from /chains right away
+        _save(data, path)
+        log_info(f"Built chain index with {len(data['chains'])} chains, {len(data['aliases'])} aliases")
+
+    if time.time() - data.get("built", 0) > ttl and _refreshing.acquire(blocking=False):
+        def run():
+            try:
+                _refresh_quietly(path)
+            finally:
+                _refreshing.release()
+        threading.Thread(target=run, name="chain-index-refresh", daemon=True).start()
+
+    return ChainIndex(data)
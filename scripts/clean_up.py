@@ -16,6 +16,9 @@ FILES_TO_DELETE = [
     DOCS_DIR / "updated_tvl.xlsx",
 ]
 
+def run(ctx=None) -> None:
+    main()
+
 def main():
     failed = False
 
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
+DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+CACHE_PATH = Path(os.environ.get("CMC_ID_CACHE", DOCS_DIR / ".cache" / "cmc_ids.json")).resolve()
+
+# Tickers CMC did not list are retried after this long; resolved ids are kept until they stop quoting.
+NEGATIVE_TTL = float(os.environ.get("CMC_ID_NEGATIVE_TTL", str(7 * 86400)))
+
+def cache_key(ticker: str, coin_name: str | None) -> str:
+    return f"{ticker}|{coin_name or ''}"
+
+class CmcIdCache:
+    # Sidecar of ticker+name -> CMC id decisions taken from the CMC map:
+    #   {"BTC|bitcoin": {"id": 1, "at": 1700000000.0, "shared": false},
+    #    "ETH|ether":   {"id": 1027, "at": ..., "shared": true, "ambiguous": true},
+    #    "XYZ|":        {"id": null, "at": ...}}            # not in the map, expires after NEGATIVE_TTL
+    # shared: several CMC coins use the ticker, so the id (not the ticker) identifies the coin.
+    def __init__(self, path: Path = CACHE_PATH, negative_ttl: float = NEGATIVE_TTL):
+        self.path         = Path(path)
+        self.negative_ttl = negative_ttl
+        self.dirty        = False
+        try:
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, ticker: str, coin_name: str | None) -> dict | None:
+        # The cached entry, or None when the pair is unknown or its negative entry has expired.
+        entry = self.entries.get(cache_key(ticker, coin_name))
+        if entry is None:
+            return None
+        if entry.get("id") is None and time.time() - entry.get("at", 0) > self.negative_ttl:
+            return None
+        if entry.get("id") is not None and "shared" not in entry:
+            return None         # written before the flag existed: resolve once more
+        return entry
+
+    def put(self, ticker: str, coin_name: str | None, cmc_id, ambiguous: bool = False, shared: bool = False) -> None:
+        entry = {"id": cmc_id, "at": time.time()}
+        if cmc_id is not None:
+            entry["shared"] = shared
+        if ambiguous:
+            entry["ambiguous"] = True
+        self.entries[cache_key(ticker, coin_name)] = entry
+        self.dirty = True
+
+    def shared_ids(self) -> set:
+        # CMC ids (as strings) whose ticker is used by more than one coin.
+        return {str(e["id"]) for e in self.entries.values() if e.get("id") is not None and e.get("shared")}
+
+    def forget_ids(self, cmc_ids) -> None:
+        drop = {str(i) for i in cmc_ids}
+        for key in [k for k, e in self.entries.items() if e.get("id") is not None and str(e["id"]) in drop]:
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A temp file per writer: batch workers save the shared cache concurrently.
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.path.parent,
+                                         prefix=f".{self.path.name}.", suffix=".tmp", delete=False) as f:
+            f.write(json.dumps(self.entries, indent=1, sort_keys=True))
+        os.replace(f.name, self.path)
+        self.dirty = False
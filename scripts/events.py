@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Optional machine-readable progress next to the human [OK]/[INFO] log. PROGRESS_EVENTS=stdout
+# (or --events) prints one "@@EVENT {...}" line per event, which desktop/main.js strips from the
+# log and forwards to the renderer; any other value is a file path that gets plain JSON lines.
+PREFIX = "@@EVENT "
+TARGET = os.environ.get("PROGRESS_EVENTS") or None
+
+# rows_done is throttled to one event per interval (plus the final one).
+PROGRESS_INTERVAL = float(os.environ.get("PROGRESS_INTERVAL", "0.25"))
+
+_lock  = threading.Lock()
+_stage = None
+
+def configure(target: str | None) -> None:
+    global TARGET
+    if target:
+        TARGET = target
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--events", nargs="?", const="stdout", default=None, metavar="FILE",
+                        help="Emit JSON-lines progress/timing events to stdout (default) or FILE")
+
+def enabled() -> bool:
+    return TARGET is not None
+
+def emit(event: str, **fields) -> None:
+    if TARGET is None:
+        return
+    record = {"event": event, "ts": round(time.time(), 3), "stage": fields.pop("stage", _stage), **fields}
+    line = json.dumps(record, default=str)
+    with _lock:
+        if TARGET == "stdout":
+            sys.stdout.write(PREFIX + line + "\n")
+            sys.stdout.flush()
+        else:
+            with open(TARGET, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+def stage_started(name: str) -> None:
+    global _stage
+    _stage = name
+    emit("stage_start", stage=name)
+
+def stage_finished(name: str, seconds: float, ok: bool, **fields) -> None:
+    global _stage
+    emit("stage_end", stage=name, seconds=round(seconds, 3), ok=ok, **fields)
+    _stage = None
+
+def file_written(path) -> None:
+    if TARGET is None:
+        return
+    path = Path(path)
+    emit("file_written", path=str(path), bytes=path.stat().st_size if path.exists() else 0)
+
+class Progress:
+    def __init__(self, total: int, unit: str = "rows"):
+        self.total = total
+        self.unit  = unit
+        self.done  = 0
+        self.last  = 0.0
+        self.lock  = threading.Lock()
+        emit("rows_total", total=total, unit=unit)
+
+    def advance(self, n: int = 1) -> None:
+        if TARGET is None:
+            return
+        with self.lock:
+            self.done += n
+            now = time.monotonic()
+            if self.done < self.total and now - self.last < PROGRESS_INTERVAL:
+                return
+            self.last = now
+            done = self.done
+        emit("rows_done", done=done, total=self.total, unit=self.unit)
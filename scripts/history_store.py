@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
+DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+DB_PATH    = Path(os.environ.get("HISTORY_DB", DOCS_DIR / ".cache" / "history.sqlite3")).resolve()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    kind   TEXT NOT NULL,
+    asset  TEXT NOT NULL,
+    ts     REAL NOT NULL,
+    value  REAL NOT NULL,
+    source TEXT,
+    PRIMARY KEY (kind, asset, ts)
+);
+"""
+
+QUERY_CHUNK = 500
+
+AGE_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_age(text: str) -> float:
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", str(text).lower())
+    if not m:
+        raise ValueError(f"invalid age '{text}' (use e.g. 90, 15m, 2h, 1d)")
+    return float(m.group(1)) * AGE_UNITS[m.group(2)]
+
+class HistoryStore:
+    def __init__(self, path: Path = DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def record(self, kind: str, values: dict, source: str | None = None, ts: float | None = None) -> None:
+        ts = time.time() if ts is None else ts
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO observations (kind, asset, ts, value, source) VALUES (?, ?, ?, ?, ?)",
+                [(kind, asset, ts, float(v), source) for asset, v in values.items()],
+            )
+
+    def latest(self, kind: str, assets, max_age: float | None = None) -> dict:
+        # One query per QUERY_CHUNK assets (SQLite caps bound parameters); with MAX(ts), SQLite
+        # returns the value from the newest row of each group.
+        since  = time.time() - max_age if max_age is not None else 0.0
+        assets = list(dict.fromkeys(assets))
+        out = {}
+        for i in range(0, len(assets), QUERY_CHUNK):
+            chunk = assets[i:i + QUERY_CHUNK]
+            rows = self.conn.execute(
+                "SELECT asset, value, MAX(ts) FROM observations "
+                f"WHERE kind = ? AND ts >= ? AND asset IN ({','.join('?' * len(chunk))}) GROUP BY asset",
+                (kind, since, *chunk),
+            )
+            out.update((asset, value) for asset, value, _ in rows)
+        return out
+
+    def as_of(self, kind: str, assets, ts: float, tolerance: float = 86400) -> dict:
+        out = {}
+        for asset in dict.fromkeys(assets):
+            row = self.conn.execute(
+                "SELECT value FROM observations WHERE kind = ? AND asset = ? AND ts <= ? AND ts >= ? "
+                "ORDER BY ts DESC LIMIT 1",
+                (kind, asset, ts, ts - tolerance),
+            ).fetchone()
+            if row is not None:
+                out[asset] = row[0]
+        return out
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import http_client
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
+DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+CACHE_DIR  = Path(os.environ.get("HTTP_CACHE_DIR", DOCS_DIR / ".cache" / "http")).resolve()
+
+# Entries are stored gzip-compressed; expired ones are revalidated with ETag/Last-Modified before
+# being downloaded again. --no-cache or HTTP_NO_CACHE=1 bypasses the cache.
+
+# (name, url substring, default TTL in seconds). The first matching entry wins;
+# URLs matching none of them are never cached. Override with HTTP_CACHE_TTL_<NAME>.
+ENDPOINTS = [
+    ("cmc_map",        "/cryptocurrency/map",    24 * 3600),
+    ("cmc_historical", "/cryptocurrency/quotes/historical", 30 * 24 * 3600),
+    ("cmc_quotes",     "/cryptocurrency/quotes", 5 * 60),
+    ("llama_chains",   "api.llama.fi/chains",    30 * 60),
+    ("llama_protocol", "api.llama.fi/protocol/", 30 * 60),
+    ("llama_listing",  "api.llama.fi/protocols", 30 * 60),
+    ("coingecko_price", "/simple/price",         5 * 60),
+    ("llama_coins",    "coins.llama.fi/prices",  5 * 60),
+]
+
+def endpoint_ttls() -> list:
+    out = []
+    for name, pattern, ttl in ENDPOINTS:
+        env = os.environ.get(f"HTTP_CACHE_TTL_{name.upper()}")
+        out.append((pattern, int(env) if env else ttl))
+    return out
+
+class HttpCache:
+    def __init__(self, root: Path = CACHE_DIR, ttls: list | None = None, enabled: bool = True):
+        self.root    = Path(root)
+        self.ttls    = endpoint_ttls() if ttls is None else ttls
+        self.enabled = enabled
+        self.hits    = 0
+        self.misses  = 0
+
+    def ttl_for(self, url: str) -> int | None:
+        return next((ttl for pattern, ttl in self.ttls if pattern in url), None)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    def load(self, key: str) -> dict | None:
+        try:
+            with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, entry: dict) -> None:
+        # A temp file per writer: batch workers and price threads may store the same key at once.
+        path = self._path(key)
+        tmp  = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{key}.", suffix=".tmp", delete=False) as raw:
+                tmp = raw.name
+                with gzip.open(raw, "wt", encoding="utf-8") as f:
+                    json.dump(entry, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except OSError as e:
+            log_warn(f"Could not write HTTP cache entry: {e}")
+            if tmp and os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def get_json(self, url: str, params: dict | None = None, headers: dict | None = None, timeout=None):
+        # Recorded/replayed runs always go through http_client so the workload stays identical.
+        use_cache = self.enabled and not http_client.recording_or_replaying()
+        ttl = self.ttl_for(url) if use_cache else None
+        if ttl is None:
+            r = http_client.get(url, headers=headers, params=params, timeout=timeout)
+            r.raise_for_status()
+            return r.json()
+
+        key   = http_client.request_key(url, params)
+        entry = self.load(key)
+        now   = time.time()
+        if entry and now - entry.get("fetched_at", 0) < ttl:
+            self.hits += 1
+            return entry["body"]
+
+        req_headers = dict(headers or {})
+        if entry and entry.get("etag"):
+            req_headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            req_headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = http_client.get(url, headers=req_headers, params=params, timeout=timeout)
+        if r.status_code == 304 and entry:
+            self.hits += 1
+            entry["fetched_at"] = now
+            self.store(key, entry)
+            return entry["body"]
+
+        r.raise_for_status()
+        self.misses += 1
+        body = r.json()
+        self.store(key, {
+            "url":           url,
+            "fetched_at":    now,
+            "etag":          r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "body":          body,
+        })
+        return body
+
+CACHE = HttpCache(enabled=not os.environ.get("HTTP_NO_CACHE"))
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+import events
+from rate_limiter import LIMITER, MAX_RETRIES, credit_cost
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+# Every API call in the scripts goes through get() (directly or via http_cache): one pooled
+# keep-alive session per host, gzip transfers, retries on 5xx/connection errors, and
+# request/byte counters per stage.
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT    = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+POOL_SIZE       = int(os.environ.get("HTTP_POOL_SIZE", "16"))
+SERVER_RETRIES  = int(os.environ.get("HTTP_RETRIES", "3"))
+
+# Record/replay of API traffic. In replay mode nothing goes to the network; latency is
+# either a fixed number of seconds or "recorded" to sleep for the originally measured time.
+# The response cache is bypassed while recording or replaying.
+RECORD_DIR     = os.environ.get("HTTP_RECORD_DIR") or None
+REPLAY_DIR     = os.environ.get("HTTP_REPLAY_DIR") or None
+REPLAY_LATENCY = os.environ.get("HTTP_REPLAY_LATENCY", "0")
+
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After")
+
+# "https://api.llama.fi=http://127.0.0.1:8765/llama,..." sends matching URLs elsewhere (e.g. the
+# bench/ mock server). Rate limits, cache and recordings keep using the original URL.
+REDIRECTS = [tuple(item.split("=", 1)) for item in os.environ.get("HTTP_REDIRECTS", "").split(",") if "=" in item]
+
+DEFAULT_HEADERS = {
+    "Accept":          "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent":      "crypto-auto-docs",
+}
+
+_sessions = {}
+_lock     = threading.Lock()
+
+# stage name -> {"requests", "bytes", "seconds"}; filled by get() under the current stage().
+STATS  = {}
+_stage = "default"
+
+class ReplayMiss(requests.ConnectionError):
+    pass
+
+def configure(record: str | None = None, replay: str | None = None, latency: str | None = None) -> None:
+    global RECORD_DIR, REPLAY_DIR, REPLAY_LATENCY
+    if record:
+        RECORD_DIR = record
+    if replay:
+        REPLAY_DIR = replay
+    if latency is not None:
+        REPLAY_LATENCY = latency
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--record", metavar="DIR", help="Save every API request/response to DIR")
+    parser.add_argument("--replay", metavar="DIR", help="Serve API responses from a --record DIR instead of the network")
+    parser.add_argument("--replay-latency", metavar="SECONDS", default=None,
+                        help="Delay per replayed request: seconds, or 'recorded' (default 0)")
+
+def configure_from_args(args) -> None:
+    configure(record=args.record, replay=args.replay, latency=args.replay_latency)
+
+def recording_or_replaying() -> bool:
+    return bool(RECORD_DIR or REPLAY_DIR)
+
+def request_key(url: str, params=None) -> str:
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.sha256(f"{url}?{query}".encode("utf-8")).hexdigest()
+
+def _save_recording(url: str, params, r, elapsed: float) -> None:
+    path = Path(RECORD_DIR) / f"{request_key(url, params)}.json.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "url":     url,
+        "params":  dict(params or {}),
+        "status":  r.status_code,
+        "headers": {h: r.headers[h] for h in RECORDED_HEADERS if h in r.headers},
+        "elapsed": elapsed,
+        "body":    r.text,
+    }
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(entry, f)
+
+def _replay(url: str, params) -> requests.Response:
+    path = Path(REPLAY_DIR) / f"{request_key(url, params)}.json.gz"
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            entry = json.load(f)
+    except OSError:
+        raise ReplayMiss(f"No recorded response for {url} {dict(params or {})}")
+
+    delay = entry.get("elapsed", 0.0) if REPLAY_LATENCY == "recorded" else float(REPLAY_LATENCY or 0)
+    if delay > 0:
+        time.sleep(delay)
+
+    r = requests.Response()
+    r.status_code = entry["status"]
+    r.headers     = CaseInsensitiveDict(entry.get("headers") or {})
+    r._content    = entry["body"].encode("utf-8")
+    r.encoding    = "utf-8"
+    r.url         = url
+    return r
+
+def _redirect(url: str) -> str:
+    for prefix, target in REDIRECTS:
+        if url.startswith(prefix):
+            return target + url[len(prefix):]
+    return url
+
+def _new_session() -> requests.Session:
+    # 5xx and connection errors are retried here; 429 is left to the rate limiter.
+    retry = Retry(
+        total=SERVER_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    s = requests.Session()
+    s.headers.update(DEFAULT_HEADERS)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+def session_for(url: str) -> requests.Session:
+    host = urlsplit(url).netloc
+    with _lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = _sessions[host] = _new_session()
+        return s
+
+@contextmanager
+def stage(name: str):
+    global _stage
+    previous, _stage = _stage, name
+    events.stage_started(name)
+    start, ok = time.monotonic(), False
+    try:
+        yield
+        ok = True
+    finally:
+        st = STATS.get(name, {})
+        events.stage_finished(name, time.monotonic() - start, ok,
+                              requests=st.get("requests", 0), bytes=st.get("bytes", 0))
+        _stage = previous
+
+def _record(nbytes: int, seconds: float, url: str = "", status: int | None = None) -> None:
+    events.emit("request", url=url, status=status, seconds=round(seconds, 4), bytes=nbytes)
+    with _lock:
+        st = STATS.setdefault(_stage, {"requests": 0, "bytes": 0, "seconds": 0.0})
+        st["requests"] += 1
+        st["bytes"]    += nbytes
+        st["seconds"]  += seconds
+
+def _wire_bytes(r) -> int:
+    try:
+        return int(r.raw.tell()) or len(r.content)
+    except Exception:
+        return len(r.content)
+
+def get(url: str, params=None, headers=None, timeout=None):
+    if REPLAY_DIR:
+        start = time.monotonic()
+        r = _replay(url, params)
+        _record(len(r.content), time.monotonic() - start, url, r.status_code)
+        return r
+
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    for attempt in range(MAX_RETRIES + 1):
+        waited = LIMITER.wait(url, credit_cost(url, params))
+        if waited:
+            events.emit("rate_limit_wait", host=urlsplit(url).hostname, seconds=round(waited, 3))
+        start = time.monotonic()
+        target = _redirect(url)
+        r = session_for(target).get(target, params=params, headers=headers, timeout=timeout)
+        elapsed = time.monotonic() - start
+        _record(_wire_bytes(r), elapsed, url, r.status_code)
+        if RECORD_DIR:
+            _save_recording(url, params, r, elapsed)
+        if r.status_code != 429 or attempt == MAX_RETRIES:
+            return r
+        delay = LIMITER.backoff(url, r, attempt)
+        log_warn(f"Rate limited by {urlsplit(url).hostname}, retrying in {delay:.1f}s")
+    return r
+
+def log_stats() -> None:
+    for name, st in STATS.items():
+        log_info(f"{name}: {st['requests']} requests, {st['bytes'] / 1024:,.1f} KB, {st['seconds']:.1f}s on the wire")
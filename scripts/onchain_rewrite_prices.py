@@ -1,7 +1,19 @@
+from __future__ import annotations
+
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from openpyxl import load_workbook
+from sheet_rows import iter_sheet_rows
+from http_cache import CACHE
+from history_store import HistoryStore
+import events
+from price_providers import chunks
+from onchain_update_prices import (load_api_key, fetch_symbol_map, shared_symbol_map, collect_targets,
+                                   asset_key, BATCH_SIZE)
 import os
 import sys
+import argparse
 def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
 def log_info(msg): print(f"[INFO] {msg}", flush=True)
 def log_warn(msg): print(f"[WARN] {msg}", flush=True)
@@ -14,40 +26,133 @@ DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
 INPUT_FILE  = DOCS_DIR / "Monthly_Performance_CVR.xlsx"
 OUTPUT_FILE = DOCS_DIR / "updated_file.xlsx"
 SHEET_NAME  = "ONCHAIN"
+START_ROW   = 4
+PRICE_COL   = "H"
+TARGET_COL  = "F"
 STOP_EMPTY_LIMIT = 10
+WORKERS          = int(os.environ.get("BACKFILL_WORKERS", "4"))
+
+CMC_HISTORICAL_URL = "https://pro-api.coinmarketcap.com/v2/cryptocurrency/quotes/historical"
+
+def rewrite_prices(ws) -> None:
+    rows = iter_sheet_rows(ws, START_ROW, (PRICE_COL,),
+                           is_empty=lambda r: not isinstance(r[1], (int, float)),
+                           stop_empty_limit=STOP_EMPTY_LIMIT)
+    for row, price in rows:
+        ws[f"{TARGET_COL}{row}"] = price
+
+def month_end(month: str | None) -> datetime:
+    if month:
+        first = datetime.strptime(month, "%Y-%m").date().replace(day=1)
+        first = (first + timedelta(days=32)).replace(day=1)
+    else:
+        first = datetime.now(timezone.utc).date().replace(day=1)
+    return datetime(first.year, first.month, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
+
+def fetch_historical_batch(ids, end: datetime, headers) -> dict:
+    # Daily quotes are stamped at 00:00 UTC, so the month's close is the quote taken at the first
+    # second of the next month (time_end is inclusive); the one at `end - 1 day` is the last day's open.
+    close_at = end + timedelta(seconds=1)
+    params = {
+        "id":         ",".join(ids),
+        "time_start": (close_at - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "time_end":   close_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "interval":   "daily",
+        "convert":    "USD",
+    }
+    data = CACHE.get_json(CMC_HISTORICAL_URL, params=params, headers=headers).get("data") or {}
+    closes = {}
+    for cmc_id in ids:
+        entry = data.get(cmc_id)
+        if isinstance(entry, list):
+            entry = entry[0] if entry else None
+        quotes = (entry or {}).get("quotes") or []
+        if quotes:
+            closes[cmc_id] = float(quotes[-1]["quote"]["USD"]["price"])
+    return closes
+
+def backfill_prices(ws, month: str | None = None, headers=None, symbol_map=None,
+                    store=None, workers: int = WORKERS, load_symbol_map=None) -> None:
+    end     = month_end(month)
+    store   = store or HistoryStore()
+    headers = headers or {"X-CMC_PRO_API_KEY": load_api_key()}
+    if load_symbol_map is None:
+        load_symbol_map = (lambda: symbol_map) if symbol_map is not None else (lambda: fetch_symbol_map(headers))
+    targets = collect_targets(ws, load_symbol_map)
+    log_info(f"Backfilling {end:%Y-%m} month-end closes for {len(targets)} rows…")
+
+    keys   = [asset_key(t, c) for _, t, c in targets]
+    closes = store.as_of("price_close", keys, end.timestamp())
+    closes.update({k: v for k, v in store.as_of("price", keys, end.timestamp(), tolerance=3600).items()
+                   if k not in closes})
+    missing = list(dict.fromkeys(c for _, t, c in targets if c and asset_key(t, c) not in closes))
+
+    log_info(f"{len(closes)} closes taken from history store, {len(missing)} to fetch")
+
+    fetched = {}
+    progress = events.Progress(len(missing), unit="assets")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        batches = list(chunks(missing, BATCH_SIZE))
+        futures = [pool.submit(fetch_historical_batch, batch, end, headers) for batch in batches]
+        for batch, fut in zip(batches, futures):
+            try:
+                fetched.update({asset_key(None, cmc_id): v for cmc_id, v in fut.result().items()})
+            except Exception as e:
+                log_warn(f"Historical quotes request failed: {e}")
+            progress.advance(len(batch))
+    store.record("price_close", fetched, source="cmc-historical", ts=end.timestamp())
+    closes.update(fetched)
+
+    for row, ticker, cmc_id in targets:
+        price = closes.get(asset_key(ticker, cmc_id))
+        if price is None:
+            log_warn(f"No {end:%Y-%m} close for {ticker}")
+            continue
+        ws[f"{TARGET_COL}{row}"] = price
+        log_ok(f"{ticker}: {end:%Y-%m} close ${price:.4f}")
 
-if not INPUT_FILE.exists():
-    log_err(f"File not found")
-    sys.exit(1)
+def run(ctx) -> None:
+    if ctx.backfill is None:
+        rewrite_prices(ctx.ws)
+        return
 
-try:
-    wb = load_workbook(str(INPUT_FILE))
-except Exception as e:
-    log_err(f"Failed to open workbook: {e}")
-    sys.exit(1)
+    ctx.api_key = ctx.api_key or load_api_key()
+    headers = {"X-CMC_PRO_API_KEY": ctx.api_key}
+    backfill_prices(ctx.ws, month=ctx.backfill or None, headers=headers, store=ctx.history(),
+                    workers=ctx.workers, load_symbol_map=lambda: shared_symbol_map(ctx, headers))
 
-if SHEET_NAME not in wb.sheetnames:
-    log_err(f"Sheet '{SHEET_NAME}' not found")
-    sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description="Copy current prices (H) into the monthly price column (F).")
+    parser.add_argument("--backfill", nargs="?", const="", default=None, metavar="YYYY-MM",
+                        help="Write month-end closes instead of column H (default month: the previous one)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Concurrent historical quote requests")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP response cache")
+    args, _ = parser.parse_known_args()
+    CACHE.enabled = CACHE.enabled and not args.no_cache
 
-ws = wb[SHEET_NAME]
+    if not INPUT_FILE.exists():
+        log_err(f"File not found")
+        sys.exit(1)
 
-empty_count = 0
-row = 4
+    try:
+        wb = load_workbook(str(INPUT_FILE))
+    except Exception as e:
+        log_err(f"Failed to open workbook: {e}")
+        sys.exit(1)
 
-while empty_count < STOP_EMPTY_LIMIT:
-    price_cell  = ws[f"H{row}"]
-    target_cell = ws[f"F{row}"]
+    if SHEET_NAME not in wb.sheetnames:
+        log_err(f"Sheet '{SHEET_NAME}' not found")
+        sys.exit(1)
 
-    val = price_cell.value
-    if isinstance(val, (int, float)):
-        target_cell.value = val
-        empty_count = 0
+    if args.backfill is None:
+        rewrite_prices(wb[SHEET_NAME])
     else:
-        empty_count += 1
+        backfill_prices(wb[SHEET_NAME], month=args.backfill or None, workers=args.workers)
 
-    row += 1
+    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(str(OUTPUT_FILE))
+    events.file_written(OUTPUT_FILE)
+    log_ok(f"Successfully rewrote prices")
 
-OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-wb.save(str(OUTPUT_FILE))
-log_ok(f"Successfully rewrote prices")
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import os
 import re
 import sys
+from copy import copy
+from functools import lru_cache
 from pathlib import Path
 from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+import events
 def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
 def log_info(msg): print(f"[INFO] {msg}", flush=True)
 def log_warn(msg): print(f"[WARN] {msg}", flush=True)
@@ -18,31 +22,108 @@ SHEET_NAME  = "ONCHAIN"
 START_ROW   = 4
 TVL_COL     = "O"
 
-CELL_REF = re.compile(r'(?P<col>\$?[A-Za-z]{1,3}\$?)(?P<row>\d+)\b')
+# A formula is split once into literal text and single-cell references. Strings,
+# references to other sheets and multi-row ranges are kept as literal text.
+FORMULA_TOKEN = re.compile(r"""
+    (?P<string>"(?:[^"]|"")*")
+  | (?<![\w.$])
+    (?P<sheet>(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?
+    (?P<col>\$?[A-Za-z]{1,3})(?P<abs>\$?)(?P<row>\d+)
+    (?::(?P<col2>\$?[A-Za-z]{1,3})(?P<abs2>\$?)(?P<row2>\d+))?
+    (?![\w(!])
+""", re.X)
+
+def _own_sheet(qualifier: str, sheet_title: str) -> bool:
+    if not qualifier:
+        return True
+    name = qualifier[:-1]
+    if name.startswith("'"):
+        name = name[1:-1].replace("''", "'")
+    return name == sheet_title
+
+@lru_cache(maxsize=4096)
+def tokenize_formula(formula: str, sheet_title: str) -> tuple:
+    parts = []
+    pos = 0
+    for m in FORMULA_TOKEN.finditer(formula):
+        if m.group("string") or not _own_sheet(m.group("sheet") or "", sheet_title):
+            continue
+        if m.group("row2") and m.group("row2") != m.group("row"):
+            continue
+        parts.append(formula[pos:m.start("col")])
+        if m.group("row2"):
+            parts.append((m.group("col"), m.group("abs"), int(m.group("row")), ":"))
+            parts.append((m.group("col2"), m.group("abs2"), int(m.group("row2")), ""))
+        else:
+            parts.append((m.group("col"), m.group("abs"), int(m.group("row")), ""))
+        pos = m.end()
+    parts.append(formula[pos:])
+    return tuple(parts)
 
-def adjust_formula(formula: str, old_row: int, new_row: int) -> str:
-    def repl(m):
-        if int(m.group('row')) == old_row:
-            return f"{m.group('col')}{new_row}"
-        return m.group(0)
-    return CELL_REF.sub(repl, formula)
+def adjust_formula(formula: str, mapping: dict, sheet_title: str) -> str:
+    out = []
+    for part in tokenize_formula(formula, sheet_title):
+        if isinstance(part, str):
+            out.append(part)
+        else:
+            col, abs_, row, sep = part
+            out.append(f"{col}{abs_}{mapping.get(row, row)}{sep}")
+    return "".join(out)
 
-def cell_val(ws, col, row):
-    return ws[f"{col}{row}"].value
+def find_blocks(ws) -> list:
+    blocks = []
+    start = None
+    tvl_idx = column_index_from_string(TVL_COL)
+    values = ws.iter_rows(min_row=START_ROW, min_col=tvl_idx, max_col=tvl_idx, values_only=True)
 
-def read_row(ws, row_idx, max_col):
-    out = []
-    for c in range(1, max_col + 1):
-        cell = ws.cell(row=row_idx, column=c)
-        val = cell.value
-        out.append((val, isinstance(val, str) and val.startswith('=')))
-    return out
-
-def write_row(ws, target_row, row_data, old_row):
-    for c, (val, was_formula) in enumerate(row_data, start=1):
-        if was_formula and isinstance(val, str):
-            val = adjust_formula(val, old_row, target_row)
-        ws.cell(row=target_row, column=c, value=val)
+    for r, (v,) in enumerate(values, start=START_ROW):
+        if isinstance(v, (int, float)):
+            if start is None:
+                start = r
+        elif start is not None:
+            blocks.append((start, r - 1))
+            start = None
+    if start is not None:
+        blocks.append((start, ws.max_row))
+    return blocks
+
+def block_permutation(ws, s: int, e: int) -> dict:
+    tvl_idx = column_index_from_string(TVL_COL)
+    values = ws.iter_rows(min_row=s, max_row=e, min_col=tvl_idx, max_col=tvl_idx, values_only=True)
+    order = sorted(((v, r) for r, (v,) in enumerate(values, start=s)), key=lambda x: x[0], reverse=True)
+    return {old: s + idx for idx, (_, old) in enumerate(order)}
+
+def apply_permutation(ws, mapping: dict, max_col: int) -> None:
+    snapshot = {}
+    for row in ws.iter_rows(min_row=min(mapping), max_row=max(mapping), max_col=max_col):
+        r = row[0].row
+        if r in mapping:
+            snapshot[r] = [(c.value, copy(c._style)) for c in row]
+    heights = {r: ws.row_dimensions[r].height for r in mapping}
+
+    for old, new in mapping.items():
+        for col, (val, style) in enumerate(snapshot[old], start=1):
+            if isinstance(val, str) and val.startswith("="):
+                val = adjust_formula(val, mapping, ws.title)
+            cell = ws.cell(row=new, column=col)
+            cell.value = val
+            cell._style = style
+        ws.row_dimensions[new].height = heights[old]
+
+def sort_by_tvl(ws) -> None:
+    blocks  = find_blocks(ws)
+    mapping = {}
+    for (s, e) in blocks:
+        mapping.update(block_permutation(ws, s, e))
+
+    if mapping:
+        apply_permutation(ws, mapping, ws.max_column)
+
+    for (s, e) in blocks:
+        log_ok(f"Sorted rows {s}–{e} by TVL")
+
+def run(ctx) -> None:
+    sort_by_tvl(ctx.ws)
 
 def main():
     if not INPUT_FILE.exists():
@@ -53,46 +134,12 @@ def main():
     if SHEET_NAME not in wb.sheetnames:
         log_err(f"Sheet '{SHEET_NAME}' not found")
         sys.exit(1)
-    ws = wb[SHEET_NAME]
 
-    max_row = ws.max_row
-    max_col = ws.max_column
-
-    blocks = []
-    in_block = False
-    start = None
-
-    for r in range(START_ROW, max_row + 1):
-        v = cell_val(ws, TVL_COL, r)
-        if isinstance(v, (int, float)):
-            if not in_block:
-                start = r
-                in_block = True
-        else:
-            if in_block:
-                blocks.append((start, r - 1))
-                in_block = False
-    if in_block:
-        blocks.append((start, max_row))
-
-    for (s, e) in blocks:
-        rows = []
-        for orig in range(s, e + 1):
-            tvl = cell_val(ws, TVL_COL, orig)
-            if isinstance(tvl, (int, float)):
-                data = read_row(ws, orig, max_col)
-                rows.append((orig, data, tvl))
-
-        rows.sort(key=lambda x: x[2], reverse=True)
-
-        for idx, (orig, data, _) in enumerate(rows):
-            dest = s + idx
-            write_row(ws, dest, data, orig)
-
-        log_ok(f"Sorted rows {s}–{e} by TVL")
+    sort_by_tvl(wb[SHEET_NAME])
 
     OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
     wb.save(str(OUTPUT_FILE))
+    events.file_written(OUTPUT_FILE)
     log_ok(f"Successfully sorted by TVL")
 
 if __name__ == "__main__":
@@ -2,120 +2,201 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 import sys
-import time
-import requests
+import argparse
 from openpyxl import load_workbook
+from http_cache import CACHE
+from sheet_rows import iter_sheet_rows
+from history_store import HistoryStore, parse_age
+from cmc_ids import CmcIdCache
+import events
+import price_providers
+from price_providers import Asset
 def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
 def log_info(msg): print(f"[INFO] {msg}", flush=True)
 def log_warn(msg): print(f"[WARN] {msg}", flush=True)
 def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
 
 SCRIPT_DIR = Path(__file__).resolve().parent
-APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()  
+APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
 DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
 
 INPUT_FILE  = DOCS_DIR / "updated_file.xlsx"
 OUTPUT_FILE = DOCS_DIR / "updated_prices.xlsx"
 
-for env_path in [APP_BASE / ".env", SCRIPT_DIR / ".env", DOCS_DIR / ".env"]:
-    if env_path.exists():
-        load_dotenv(env_path)
-
-API_KEY = os.getenv("API_KEY")
-if not API_KEY:
-    log_err("API_KEY is missing. Put it in .env (APP_BASE/.env) or set it in the environment.")
-    sys.exit(1)
-
 SHEET_NAME       = "ONCHAIN"
 START_ROW        = 4
 NAME_COL         = "B"
 SYMBOL_COL       = "C"
 PRICE_COL        = "H"
 STOP_EMPTY_LIMIT = 10
-REQUEST_DELAY    = 2.1
+BATCH_SIZE       = int(os.environ.get("CMC_BATCH_SIZE", "100"))
 
 CMC_MAP_URL   = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/map"
-CMC_QUOTE_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-HEADERS       = {"X-CMC_PRO_API_KEY": API_KEY}
 
-def fetch(url, params=None):
+def load_api_key() -> str:
+    for env_path in [APP_BASE / ".env", SCRIPT_DIR / ".env", DOCS_DIR / ".env"]:
+        if env_path.exists():
+            load_dotenv(env_path)
+
+    api_key = os.getenv("API_KEY")
+    if not api_key:
+        log_err("API_KEY is missing. Put it in .env (APP_BASE/.env) or set it in the environment.")
+        sys.exit(1)
+    return api_key
+
+def fetch(url, headers, params=None):
     try:
-        r = requests.get(url, headers=HEADERS, params=params, timeout=20)
-        r.raise_for_status()
-        return r.json()
+        return CACHE.get_json(url, params=params, headers=headers)
     except Exception as e:
         log_err(f"CMC request failed for {url}: {e}")
         sys.exit(1)
 
-log_info("Fetching CMC mapping…")
-cmc_map = fetch(CMC_MAP_URL).get("data", [])
-symbol_map = {}
-for entry in cmc_map:
-    sym = str(entry.get("symbol", "")).upper()
-    if sym:
-        symbol_map.setdefault(sym, []).append(entry)
-
-if not INPUT_FILE.exists():
-    log_err(f"Input file not found")
-    sys.exit(1)
-
-wb = load_workbook(str(INPUT_FILE))
-if SHEET_NAME not in wb.sheetnames:
-    log_err(f"Sheet '{SHEET_NAME}' not found")
-    sys.exit(1)
-ws = wb[SHEET_NAME]
-
-row = START_ROW
-empty_count = 0
-
-while empty_count < STOP_EMPTY_LIMIT:
-    name_val   = ws[f"{NAME_COL}{row}"].value
-    symbol_val = ws[f"{SYMBOL_COL}{row}"].value
-
-    if symbol_val is None or (isinstance(symbol_val, str) and not symbol_val.strip()):
-        empty_count += 1
-        row += 1
-        continue
-
-    empty_count = 0
-    ticker = str(symbol_val).strip().upper()
-    if ticker == "SYMBOLS":
-        row += 1
-        continue
-
-    coin_name = str(name_val).strip().lower() if name_val else None
-
+def fetch_symbol_map(headers) -> dict:
+    log_info("Fetching CMC mapping…")
+    cmc_map = fetch(CMC_MAP_URL, headers).get("data", [])
+    symbol_map = {}
+    for entry in cmc_map:
+        sym = str(entry.get("symbol", "")).upper()
+        if sym:
+            symbol_map.setdefault(sym, []).append(entry)
+    return symbol_map
+
+def shared_symbol_map(ctx, headers) -> dict:
+    # The CMC map is downloaded at most once per context, and only when a stage asks for it.
+    if "cmc_symbol_map" not in ctx.shared:
+        ctx.shared["cmc_symbol_map"] = fetch_symbol_map(headers)
+    return ctx.shared["cmc_symbol_map"]
+
+def resolve_id(symbol_map, ticker, coin_name):
+    # (cmc_id, ambiguous) for a ticker, preferring the candidate whose name matches column B.
     candidates = symbol_map.get(ticker, [])
-    cmc_id = None
     if not candidates:
-        log_warn(f"No CMC map entry for {ticker}")
-    elif len(candidates) == 1:
-        cmc_id = candidates[0].get("id")
+        return None, False
+    if len(candidates) == 1:
+        return candidates[0].get("id"), False
+    match = next((c for c in candidates if str(c.get("name", "")).lower() == (coin_name or "")), None)
+    return (match or candidates[0]).get("id"), match is None
+
+def collect_targets(ws, load_symbol_map, ids=None) -> list:
+    # Ticker+name pairs already in the CMC id cache skip the map; load_symbol_map() is only
+    # called when at least one row still needs resolving.
+    ids  = ids if ids is not None else CmcIdCache()
+    rows = []
+    for row, symbol_val, name_val in iter_sheet_rows(ws, START_ROW, (SYMBOL_COL, NAME_COL),
+                                                      stop_empty_limit=STOP_EMPTY_LIMIT):
+        ticker = str(symbol_val).strip().upper()
+        if ticker == "SYMBOLS":
+            continue
+        coin_name = str(name_val).strip().lower() if name_val else None
+        rows.append((row, ticker, coin_name))
+
+    unresolved = [r for r in rows if ids.get(r[1], r[2]) is None]
+    if unresolved:
+        symbol_map = load_symbol_map()
     else:
-        match = next((c for c in candidates if str(c.get("name", "")).lower() == (coin_name or "")), None)
-        cmc_id = (match or candidates[0]).get("id")
-        if match is None:
-            log_warn(f"Ambiguous ticker {ticker}, using id {cmc_id}")
-
-    params = {"convert": "USD"}
-    if cmc_id:
-        params["id"] = cmc_id
-        key = str(cmc_id)
-    else:
-        params["symbol"] = ticker
-        key = ticker
+        log_info(f"All {len(rows)} tickers resolved from the CMC id cache, skipping the map download")
+
+    targets, unlisted = [], 0
+    for row, ticker, coin_name in rows:
+        entry = ids.get(ticker, coin_name)
+        if entry is None:
+            cmc_id, ambiguous = resolve_id(symbol_map, ticker, coin_name)
+            ids.put(ticker, coin_name, cmc_id, ambiguous=ambiguous,
+                    shared=len(symbol_map.get(ticker, [])) > 1)
+            if cmc_id is None:
+                log_warn(f"No CMC map entry for {ticker}")
+            elif ambiguous:
+                log_warn(f"Ambiguous ticker {ticker}, using id {cmc_id}")
+        else:
+            cmc_id = entry["id"]
+            unlisted += cmc_id is None
+        targets.append((row, ticker, str(cmc_id) if cmc_id else None))
+
+    if unlisted:
+        log_info(f"{unlisted} ticker(s) cached as missing from the CMC map, quoted by symbol")
+    ids.save()
+    return targets
+
+def fetch_prices(targets, api_key, store, shared=frozenset()) -> tuple:
+    # ({asset_key: (price, source)}, {asset keys CMC answered for without a quote}) from the
+    # configured providers (CMC first by default), recorded in the history store. Ids in
+    # `shared` share their ticker with other coins and are only asked of CMC.
+    assets = list({asset_key(t, c): Asset(asset_key(t, c), t, c, c in shared) for _, t, c in targets}.values())
+    log_info(f"Fetching {len(assets)} prices ({price_providers.PROVIDERS})…")
+    progress = events.Progress(len(assets), unit="assets")
+    router   = price_providers.router(api_key)
+    quoted   = router.fetch(assets, progress)
+    price_providers.record(store, quoted, assets)
+    return quoted, router.missed.get("cmc", set())
+
+def asset_key(ticker: str, cmc_id) -> str:
+    return f"cmc:{cmc_id}" if cmc_id else f"sym:{ticker}"
+
+def update_prices(ws, headers=None, symbol_map=None, store=None, max_age=None, load_symbol_map=None) -> None:
+    headers = headers or {"X-CMC_PRO_API_KEY": load_api_key()}
+    if load_symbol_map is None:
+        load_symbol_map = (lambda: symbol_map) if symbol_map is not None else (lambda: fetch_symbol_map(headers))
+    store   = store or HistoryStore()
+    ids     = CmcIdCache()
+    targets = collect_targets(ws, load_symbol_map, ids)
+
+    prices = {}
+    if max_age is not None:
+        prices = store.latest("price", (asset_key(t, c) for _, t, c in targets), max_age=max_age)
+        log_info(f"{len(prices)} prices newer than {max_age:g}s served from history store")
+
+    stale  = [t for t in targets if asset_key(t[1], t[2]) not in prices]
+    quoted, unlisted = (fetch_prices(stale, headers.get("X-CMC_PRO_API_KEY"), store, ids.shared_ids())
+                        if stale else ({}, set()))
+
+    # An id CMC answered for without a quote (delisted, migrated) is dropped so the next run
+    # re-resolves it; ids that merely timed out or failed are kept.
+    ids.forget_ids(c for _, t, c in stale if c and asset_key(t, c) in unlisted)
+    ids.save()
+    sources = {k: "history" for k in prices}
+    prices.update({k: p for k, (p, _) in quoted.items()})
+    sources.update({k: src for k, (_, src) in quoted.items()})
+
+    for row, ticker, cmc_id in targets:
+        key   = asset_key(ticker, cmc_id)
+        price = prices.get(key)
+        if price is None:
+            log_warn(f"No quote returned for {ticker}")
+            continue
+        ws[f"{PRICE_COL}{row}"] = price
+        log_ok(f"{ticker}: ${price:.4f} ({sources[key]})")
+
+def run(ctx) -> None:
+    ctx.api_key = ctx.api_key or load_api_key()
+    headers = {"X-CMC_PRO_API_KEY": ctx.api_key}
+    update_prices(ctx.ws, headers=headers, load_symbol_map=lambda: shared_symbol_map(ctx, headers),
+                  store=ctx.history(), max_age=ctx.max_age)
+
+def main():
+    parser = argparse.ArgumentParser(description="Update ONCHAIN prices from CoinMarketCap.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP response cache")
+    parser.add_argument("--max-age", type=parse_age, default=None,
+                        help="Reuse prices from the local history store newer than this (e.g. 900, 15m, 2h)")
+    price_providers.add_arguments(parser)
+    args, _ = parser.parse_known_args()
+    CACHE.enabled = CACHE.enabled and not args.no_cache
+    price_providers.configure_from_args(args)
+
+    if not INPUT_FILE.exists():
+        log_err(f"Input file not found")
+        sys.exit(1)
 
-    try:
-        data = fetch(CMC_QUOTE_URL, params=params)
-        price = data["data"][key]["quote"]["USD"]["price"]
-        ws[f"{PRICE_COL}{row}"] = float(price)
-        log_ok(f"{ticker}: ${price:.4f}")
-    except Exception as e:
-        log_err(f"Error fetching price for {ticker}: {e}")
+    wb = load_workbook(str(INPUT_FILE))
+    if SHEET_NAME not in wb.sheetnames:
+        log_err(f"Sheet '{SHEET_NAME}' not found")
+        sys.exit(1)
+
+    update_prices(wb[SHEET_NAME], max_age=args.max_age)
 
-    time.sleep(REQUEST_DELAY)
-    row += 1
+    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(str(OUTPUT_FILE))
+    events.file_written(OUTPUT_FILE)
+    log_ok(f"Prices updated")
 
-OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-wb.save(str(OUTPUT_FILE))
-log_ok(f"Prices updated")
+if __name__ == "__main__":
+    main()
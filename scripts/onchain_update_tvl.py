@@ -1,17 +1,22 @@
 import sys
 import os
-import time
+import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import requests
 from openpyxl import load_workbook
+from http_cache import CACHE
+from sheet_rows import iter_sheet_rows, is_blank
+from history_store import HistoryStore, parse_age
+import events
+import chain_index
 def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
 def log_info(msg): print(f"[INFO] {msg}", flush=True)
 def log_warn(msg): print(f"[WARN] {msg}", flush=True)
 def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
 
 SCRIPT_DIR = Path(__file__).resolve().parent
-DEFAULT_DOCS_DIR = (SCRIPT_DIR / ".." / "docs").resolve()  
+DEFAULT_DOCS_DIR = (SCRIPT_DIR / ".." / "docs").resolve()
 DOCS_DIR = Path(os.environ.get("DOCS_DIR", str(DEFAULT_DOCS_DIR))).resolve()
 
 INPUT_FILE  = DOCS_DIR / "updated_prices.xlsx"
@@ -25,22 +30,24 @@ TYPE_COL         = "E"
 TVL_COL          = "O"
 
 STOP_EMPTY_LIMIT = 10
-REQUEST_DELAY    = 1.0
+WORKERS          = int(os.environ.get("TVL_WORKERS", "8"))
+ENGINE           = os.environ.get("TVL_ENGINE", "protocol")
 
 def fetch(url):
     try:
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
-        return r.json()
+        return CACHE.get_json(url)
     except Exception as e:
         log_err(f"Failed to fetch {url}: {e}")
         sys.exit(1)
 
 def fetch_single_protocol(slug: str) -> dict:
-    return fetch(f"https://api.llama.fi/protocol/{slug}")
+    return CACHE.get_json(f"https://api.llama.fi/protocol/{slug}")
 
 def fetch_all_chains() -> list:
-    return fetch("https://api.llama.fi/chains")
+    return fetch(chain_index.LLAMA_CHAINS_URL)
+
+def fetch_protocol_listing() -> list:
+    return fetch("https://api.llama.fi/protocols")
 
 def compute_protocol_tvl(data: dict) -> float:
     cc = data.get("currentChainTvls", {})
@@ -54,78 +61,158 @@ def compute_protocol_tvl(data: dict) -> float:
     borrowed = cc.get("borrowed", 0) or 0
     return deposits + staking + borrowed
 
-chains = fetch_all_chains()
-chain_map = {}
-for c in chains:
-    ts = (c.get("tokenSymbol") or "").upper()
-    if ts:
-        chain_map[ts] = c
-    name = (c.get("name") or "").upper()
-    if name:
-        chain_map[name] = c
-
-if not INPUT_FILE.exists():
-    log_err(f"Input file not found")
-    sys.exit(1)
-
-wb = load_workbook(str(INPUT_FILE))
-if SHEET_NAME not in wb.sheetnames:
-    log_err(f"Sheet '{SHEET_NAME}' not found")
-    sys.exit(1)
-ws = wb[SHEET_NAME]
-
-row = START_ROW
-empty_count = 0
-
-while empty_count < STOP_EMPTY_LIMIT:
-    symbol = ws[f"{SYMBOL_COL}{row}"].value
-    slug   = ws[f"{SLUG_COL}{row}"].value
-    typ    = ws[f"{TYPE_COL}{row}"].value
-    tvl_cell = ws[f"{TVL_COL}{row}"]
-
-    if not symbol or (isinstance(symbol, str) and not symbol.strip()):
-        empty_count += 1
-        row += 1
-        continue
-
-    empty_count = 0
-    symbol = str(symbol).strip()
-    slug   = (slug or "").strip()
-    typ    = (typ or "").strip().lower()
-
-    if slug.lower() == "slug" or typ.lower() == "type":
-        row += 1
-        continue
-
-    total_tvl = None
-
-    if typ == "protocol" and slug:
-        try:
-            data = fetch_single_protocol(slug)
-            total_tvl = compute_protocol_tvl(data)
-            log_ok(f"Protocol {symbol:<8} ({slug}) → TVL = ${total_tvl:,.2f}")
-        except Exception as e:
-            log_warn(f"Protocol error for {symbol}/{slug}: {e}")
-
-    elif typ == "chain":
-        entry = chain_map.get(slug.upper()) or chain_map.get(symbol.upper())
-        if entry:
-            total_tvl = entry.get("tvlUsd") or entry.get("tvl") or 0
-            log_ok(f"Chain    {symbol:<8} ({entry.get('name','?')}) → TVL = ${total_tvl:,.2f}")
+def build_listing_index(listing: list) -> dict:
+    index = {}
+    for p in listing:
+        slug = (p.get("slug") or "").lower()
+        cc = p.get("chainTvls")
+        if slug and isinstance(cc, dict):
+            index[slug] = compute_protocol_tvl({"currentChainTvls": cc})
+    return index
+
+def fetch_protocol_tvls(slugs, workers: int) -> dict:
+    results = {}
+    progress = events.Progress(len(slugs), unit="protocols")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(fetch_single_protocol, slug): slug for slug in slugs}
+        for fut in as_completed(futures):
+            slug = futures[fut]
+            try:
+                results[slug] = compute_protocol_tvl(fut.result())
+            except Exception as e:
+                results[slug] = e
+            progress.advance()
+    return results
+
+def fetch_chain_map() -> dict:
+    # Normalized chain name -> /chains entry. Only the TVL numbers are taken from here;
+    # which chain a row means is decided by the persisted chain index.
+    return {chain_index.normalize(c.get("name")): c for c in fetch_all_chains() if c.get("name")}
+
+def collect_targets(ws) -> list:
+    targets = []
+    rows = iter_sheet_rows(ws, START_ROW, (SYMBOL_COL, SLUG_COL, TYPE_COL),
+                           is_empty=lambda r: not r[1] or is_blank(r[1]),
+                           stop_empty_limit=STOP_EMPTY_LIMIT)
+
+    for row, symbol, slug, typ in rows:
+        symbol = str(symbol).strip()
+        slug   = (slug or "").strip()
+        typ    = (typ or "").strip().lower()
+
+        if slug.lower() == "slug" or typ.lower() == "type":
+            continue
+
+        targets.append((row, symbol, slug, typ))
+
+    return targets
+
+def protocol_key(slug: str) -> str:
+    return f"protocol:{slug.lower()}"
+
+def chain_key(slug: str, symbol: str) -> str:
+    return f"chain:{(slug or symbol).upper()}"
+
+def update_tvl(ws, workers: int = WORKERS, engine: str = ENGINE, get_chain_map=fetch_chain_map,
+               store=None, max_age=None, index=None) -> None:
+    store   = store or HistoryStore()
+    index   = index or chain_index.load()
+    targets = collect_targets(ws)
+
+    fresh = {}
+    if max_age is not None:
+        keys  = [protocol_key(slug) if typ == "protocol" else chain_key(slug, symbol)
+                 for _, symbol, slug, typ in targets if typ in ("protocol", "chain")]
+        fresh = store.latest("tvl", keys, max_age=max_age)
+        log_info(f"{len(fresh)} TVL values newer than {max_age:g}s served from history store")
+
+    slugs = list(dict.fromkeys(slug for _, _, slug, typ in targets
+                               if typ == "protocol" and slug and protocol_key(slug) not in fresh))
+    log_info(f"Fetching TVL for {len(slugs)} protocols ({engine} engine)…")
+
+    protocol_tvls = {}
+    if engine == "listing" and slugs:
+        index = build_listing_index(fetch_protocol_listing())
+        protocol_tvls = {slug: index[slug.lower()] for slug in slugs if slug.lower() in index}
+        slugs = [slug for slug in slugs if slug not in protocol_tvls]
+        log_info(f"Protocols listing covered {len(protocol_tvls)} slugs, {len(slugs)} need /protocol fallback")
+    protocol_tvls.update(fetch_protocol_tvls(slugs, workers))
+
+    needs_chains = any(typ == "chain" and chain_key(slug, symbol) not in fresh for _, symbol, slug, typ in targets)
+    chain_map = get_chain_map() if needs_chains else {}
+    fetched = {}
+
+    for row, symbol, slug, typ in targets:
+        total_tvl = None
+
+        if typ == "protocol" and slug:
+            result = fresh.get(protocol_key(slug), protocol_tvls.get(slug))
+            if isinstance(result, Exception):
+                log_warn(f"Protocol error for {symbol}/{slug}: {result}")
+            elif result is not None:
+                total_tvl = result
+                if protocol_key(slug) not in fresh:
+                    fetched[protocol_key(slug)] = total_tvl
+                log_ok(f"Protocol {symbol:<8} ({slug}) → TVL = ${total_tvl:,.2f}")
+
+        elif typ == "chain" and chain_key(slug, symbol) in fresh:
+            total_tvl = fresh[chain_key(slug, symbol)]
+            log_ok(f"Chain    {symbol:<8} ({slug or symbol}) → TVL = ${total_tvl:,.2f}")
+
+        elif typ == "chain":
+            key   = index.resolve(slug, symbol) or chain_index.normalize(slug or symbol)
+            entry = chain_map.get(key)
+            if entry:
+                total_tvl = entry.get("tvlUsd") or entry.get("tvl") or 0
+                fetched[chain_key(slug, symbol)] = total_tvl
+                log_ok(f"Chain    {symbol:<8} ({entry.get('name','?')}) → TVL = ${total_tvl:,.2f}")
+            else:
+                log_warn(f"Chain not found for slug/symbol '{slug or symbol}'")
+
+        else:
+            log_warn(f"Row {row}: unknown type '{typ}' or missing slug '{slug}'")
+
+        if total_tvl and total_tvl > 0:
+            ws[f"{TVL_COL}{row}"] = round(float(total_tvl), 2)
         else:
-            log_warn(f"Chain not found for slug/symbol '{slug or symbol}'")
+            ws[f"{TVL_COL}{row}"] = "N/A"
+
+    store.record("tvl", fetched, source="defillama")
+
+def run(ctx) -> None:
+    if "chain_index" not in ctx.shared:
+        ctx.shared["chain_index"] = chain_index.load()
+    update_tvl(ctx.ws, workers=ctx.workers, engine=ctx.engine, store=ctx.history(),
+               max_age=ctx.max_age, index=ctx.shared["chain_index"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Update ONCHAIN TVL from DefiLlama.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP response cache")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Concurrent /protocol requests (1 = sequential)")
+    parser.add_argument("--engine", choices=("protocol", "listing"), default=ENGINE,
+                        help="'protocol' fetches /protocol/{slug} per row; 'listing' uses one /protocols download "
+                             "and falls back to /protocol/{slug} for slugs it lacks")
+    parser.add_argument("--max-age", type=parse_age, default=None,
+                        help="Reuse TVL values from the local history store newer than this (e.g. 900, 15m, 2h)")
+    args, _ = parser.parse_known_args()
+    CACHE.enabled = CACHE.enabled and not args.no_cache
+
+    if not INPUT_FILE.exists():
+        log_err(f"Input file not found")
+        sys.exit(1)
 
-    else:
-        log_warn(f"Row {row}: unknown type '{typ}' or missing slug '{slug}'")
+    wb = load_workbook(str(INPUT_FILE))
+    if SHEET_NAME not in wb.sheetnames:
+        log_err(f"Sheet '{SHEET_NAME}' not found")
+        sys.exit(1)
 
-    if total_tvl and total_tvl > 0:
-        tvl_cell.value = round(float(total_tvl), 2)
-    else:
-        tvl_cell.value = "N/A"
+    update_tvl(wb[SHEET_NAME], workers=args.workers, engine=args.engine, max_age=args.max_age)
 
-    row += 1
-    time.sleep(REQUEST_DELAY)
+    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(str(OUTPUT_FILE))
+    events.file_written(OUTPUT_FILE)
+    log_ok(f"TVL update complete")
 
-OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-wb.save(str(OUTPUT_FILE))
-log_ok(f"TVL update complete")
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import os
-import time
 import argparse
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
 from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
 from typing import Optional
+import http_client
+from sheet_rows import column_values
+from xlsx_patch import patch_cells, changed_cells, XlsxPatchError
+from history_store import HistoryStore, parse_age
+import events
+import price_providers
+from price_providers import Asset
+from profiling import Profiler
 def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
 def log_info(msg): print(f"[INFO] {msg}", flush=True)
 def log_warn(msg): print(f"[WARN] {msg}", flush=True)
@@ -18,53 +25,119 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 ROOT_DIR   = SCRIPT_DIR.parent                            
 DOCS_DIR   = ROOT_DIR / "docs"                            
 
-load_dotenv(ROOT_DIR / ".env")
-load_dotenv(SCRIPT_DIR / ".env")  
-
-API_KEY = os.getenv("API_KEY")
-
-CMC_URL  = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-HEADERS  = {"X-CMC_PRO_API_KEY": API_KEY}
-
 SHEET_NAME       = "PERFORMANCE_TABLE"
 START_ROW        = 2
 SYMBOL_COL       = "C"
 PRICE_COL        = "E"
 STOP_EMPTY_LIMIT = 10
-REQUEST_DELAY    = 2.1 
 
 YELLOW_RGB = "FFFF00"
 
-def _color_hex6(fg) -> Optional[str]:
-    if not fg:
+# "openpyxl" re-serializes the whole workbook; "patch" writes only the changed price cells into
+# a copy of the input file (see xlsx_patch.py) and leaves every other part of it untouched.
+WRITER = os.environ.get("XLSX_WRITER", "openpyxl")
+
+# DOCS_DIR above is relative to this file, which is a temp dir in the PyInstaller build;
+# profiles follow the DOCS_DIR the desktop app passes in instead.
+PROFILER = Profiler(root=Path(os.environ.get("DOCS_DIR", DOCS_DIR)) / "profiles", name="weekly")
+
+# Theme colour slots in the order <a:clrScheme> lists them, and the order fgColor theme=N uses.
+SCHEME_ORDER = ("dk1", "lt1", "dk2", "lt2", "accent1", "accent2", "accent3", "accent4",
+                "accent5", "accent6", "hlink", "folHlink")
+THEME_INDEX  = ("lt1", "dk1", "lt2", "dk2", "accent1", "accent2", "accent3", "accent4",
+                "accent5", "accent6", "hlink", "folHlink")
+
+def theme_colors(theme_xml) -> list:
+    # RGB hex per fgColor theme index, from the workbook's theme1.xml (empty if there is none).
+    if not theme_xml:
+        return []
+    from xml.etree import ElementTree as ET
+    ns = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main"}
+    scheme = ET.fromstring(theme_xml).find(".//a:clrScheme", ns)
+    if scheme is None:
+        return []
+    slots = {}
+    for name in SCHEME_ORDER:
+        el = scheme.find(f"a:{name}", ns)
+        color = None if el is None else (el.find("a:srgbClr", ns) if el.find("a:srgbClr", ns) is not None
+                                         else el.find("a:sysClr", ns))
+        if color is not None:
+            slots[name] = (color.get("val") if color.tag.endswith("srgbClr") else color.get("lastClr")) or None
+    return [str(slots.get(name) or "").upper() for name in THEME_INDEX]
+
+def apply_tint(hex6: str, tint: float) -> str:
+    # Excel's tint: scales HLS lightness towards black (tint < 0) or white (tint > 0).
+    if not tint:
+        return hex6
+    import colorsys
+    r, g, b = (int(hex6[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    l = l * (1 + tint) if tint < 0 else l * (1 - tint) + tint
+    return "".join(f"{round(c * 255):02X}" for c in colorsys.hls_to_rgb(h, l, s))
+
+def color_hex6(color, palette, theme) -> Optional[str]:
+    # RGB hex of an openpyxl Color given as rgb, indexed (workbook palette) or theme (+ tint).
+    if color is None:
         return None
+    kind, value = getattr(color, "type", None), getattr(color, "value", None)
+    hex6 = None
+    if kind == "rgb" and isinstance(value, str) and len(value) in (6, 8):
+        hex6 = value[-6:].upper()
+    elif kind == "indexed" and isinstance(value, int) and 0 <= value < len(palette):
+        hex6 = str(palette[value])[-6:].upper()
+    elif kind == "theme" and isinstance(value, int) and 0 <= value < len(theme):
+        hex6 = theme[value] or None
+    if hex6 and getattr(color, "tint", 0):
+        hex6 = apply_tint(hex6, color.tint)
+    return hex6
 
-    for attr in ("rgb", "value"):
-        v = getattr(fg, attr, None)
-        if v:
-            try:
-                s = str(v).strip().upper()
-            except Exception:
-                continue
-            if len(s) == 8:
-                s = s[-6:]
-            if len(s) == 6:
-                return s
-
-    idx = getattr(fg, "indexed", None)
-    if isinstance(idx, int) and idx == 6:
-        return YELLOW_RGB
-    
-    return None
-
-def is_yellow(cell) -> bool:
-    fill = getattr(cell, "fill", None)
-    if not fill or getattr(fill, "fill_type", None) != "solid":
-        return False
-
-    fg = getattr(fill, "fgColor", None)
-    hex6 = _color_hex6(fg)
-    return hex6 == YELLOW_RGB
+class YellowRule:
+    # The "yellow price cell" test compiled once per workbook: the fills whose solid colour resolves
+    # to YELLOW_RGB (rgb, indexed or theme colour, tint applied), and the cell style ids (xfs) that use them.
+    # Matching a cell is then a set lookup on its style instead of walking fill/colour attributes.
+    def __init__(self, wb):
+        from openpyxl.styles.colors import COLOR_INDEX
+        palette = wb._colors or COLOR_INDEX
+        theme   = theme_colors(getattr(wb, "loaded_theme", None))
+        self.fill_ids = {
+            i for i, fill in enumerate(wb._fills)
+            if getattr(fill, "fill_type", None) == "solid"
+            and color_hex6(getattr(fill, "fgColor", None), palette, theme) == YELLOW_RGB
+        }
+        self.style_ids = {i for i, st in enumerate(wb._cell_styles) if st.fillId in self.fill_ids}
+
+    def matches(self, cell) -> bool:
+        style_id = getattr(cell, "_style_id", None)      # read-only cells carry the xf index
+        if style_id is not None:
+            return style_id in self.style_ids
+        style = getattr(cell, "_style", None)            # regular cells carry the StyleArray
+        return style is not None and style.fillId in self.fill_ids
+
+def select_rows(ws, rule: YellowRule | None = None) -> tuple:
+    # One pass over the symbol and price columns: ([(row, ticker), ...] to price, rows skipped).
+    # Stops after STOP_EMPTY_LIMIT consecutive empty symbols, like iter_sheet_rows.
+    rule  = rule or YellowRule(ws.parent)
+    sym   = column_index_from_string(SYMBOL_COL)
+    price = column_index_from_string(PRICE_COL)
+    lo, hi = min(sym, price), max(sym, price)
+
+    targets, skipped, empty = [], 0, 0
+    for r, cells in enumerate(ws.iter_rows(min_row=START_ROW, min_col=lo, max_col=hi), start=START_ROW):
+        symbol = cells[sym - lo].value if sym - lo < len(cells) else None
+        if symbol is None:
+            empty += 1
+            if empty >= STOP_EMPTY_LIMIT:
+                break
+            continue
+        empty  = 0
+        ticker = str(symbol).strip().upper()
+        if ticker == "TICKER":
+            continue
+        if price - lo < len(cells) and rule.matches(cells[price - lo]):
+            targets.append((r, ticker))
+        else:
+            skipped += 1
+    return targets, skipped
 
 def smart_round(price: float) -> float:
     if price >= 0.01:
@@ -74,73 +147,130 @@ def smart_round(price: float) -> float:
         decimals += 1
     return round(price, decimals)
 
-def fetch_cmc_price(symbol: str) -> float | None:
-    params = {"symbol": symbol, "convert": "USD"}
-    r = requests.get(CMC_URL, headers=HEADERS, params=params, timeout=20)
-    data = r.json() if r.content else {}
-    try:
-        return data["data"][symbol]["quote"]["USD"]["price"]
-    except Exception:
-        return None
+def price_rows(ws, headers: dict, store=None, max_age: Optional[float] = None) -> dict:
+    # {row: rounded price} for the yellow rows of ws. Only reads ws, so it may come from a
+    # read_only=True workbook.
+    store = store or HistoryStore()
+    targets, skipped = select_rows(ws)
+    log_info(f"{len(targets)} yellow price cells to update, {skipped} other rows left as they are")
 
-def run(input_path: Path, output_path: Path) -> None:
-    if not API_KEY:
+    # Rows are selected before any request; a ticker on several rows is priced once.
+    keys  = {ticker: f"sym:{ticker}" for _, ticker in targets}
+    fresh = store.latest("price", keys.values(), max_age=max_age) if max_age is not None else {}
+    stale = [t for t in keys if keys[t] not in fresh]
+    if max_age is not None:
+        log_info(f"{len(keys) - len(stale)} prices newer than {max_age:g}s served from history store")
+
+    # Stale tickers are priced in per-provider batches (CMC by symbol first), not one request each.
+    progress = events.Progress(len(stale), unit="assets")
+    assets   = [Asset(keys[t], t, None) for t in stale]
+    quoted   = price_providers.router(headers.get("X-CMC_PRO_API_KEY")).fetch(assets, progress) if stale else {}
+    price_providers.record(store, quoted, assets)
+
+    out = {}
+    for row, ticker in targets:
+        key = keys[ticker]
+        if key in fresh:
+            price, source = fresh[key], "history store"
+        elif key in quoted:
+            price, source = quoted[key]
+        else:
+            log_warn(f"Symbol {ticker} not found in any price provider response.")
+            continue
+        out[row] = smart_round(price)
+        log_ok(f"{ticker}: ${out[row]} ({source})")
+    return out
+
+def update_prices(ws, headers: dict, store=None, max_age: Optional[float] = None) -> None:
+    for row, price in price_rows(ws, headers, store=store, max_age=max_age).items():
+        ws[f"{PRICE_COL}{row}"].value = price
+
+def load_api_key() -> Optional[str]:
+    load_dotenv(ROOT_DIR / ".env")
+    load_dotenv(SCRIPT_DIR / ".env")
+    return os.getenv("API_KEY")
+
+def run(input_path: Path, output_path: Path, max_age: Optional[float] = None, writer: str = WRITER) -> None:
+    api_key = load_api_key()
+    if not api_key:
         raise SystemExit("API_KEY is missing. Put it in .env at repo root or scripts/.")
+    headers = {"X-CMC_PRO_API_KEY": api_key}
 
     if not input_path.exists():
         raise SystemExit(f"Input file not found")
 
-    wb = load_workbook(str(input_path))
-    if SHEET_NAME not in wb.sheetnames:
-        raise SystemExit(f"Sheet '{SHEET_NAME}' not found")
-    ws = wb[SHEET_NAME]
+    if writer == "patch":
+        run_patched(input_path, output_path, headers, max_age)
+    else:
+        with PROFILER.stage("load_workbook"):
+            wb = load_workbook(str(input_path))
+        if SHEET_NAME not in wb.sheetnames:
+            raise SystemExit(f"Sheet '{SHEET_NAME}' not found")
+        with http_client.stage("performance_table_update_prices"), PROFILER.stage("performance_table_update_prices"):
+            update_prices(wb[SHEET_NAME], headers, max_age=max_age)
+        with PROFILER.stage("save_workbook"):
+            wb.save(str(output_path))
+    events.file_written(output_path)
+    http_client.log_stats()
+    log_ok(f"Successfully updated prices")
 
-    row = START_ROW
-    empty_count = 0
+def run_patched(input_path: Path, output_path: Path, headers: dict, max_age: Optional[float]) -> None:
+    # The rows to price are read from a read_only=True workbook and the new prices patched into the
+    # file, so the full styled workbook is only loaded if the patch is not possible.
+    with PROFILER.stage("load_workbook"):
+        wb = load_workbook(str(input_path), read_only=True)
+    try:
+        if SHEET_NAME not in wb.sheetnames:
+            raise SystemExit(f"Sheet '{SHEET_NAME}' not found")
+        ws     = wb[SHEET_NAME]
+        before = column_values(ws, (PRICE_COL,), START_ROW)
+        with http_client.stage("performance_table_update_prices"), PROFILER.stage("performance_table_update_prices"):
+            prices = price_rows(ws, headers, max_age=max_age)
+    finally:
+        wb.close()
 
-    while empty_count < STOP_EMPTY_LIMIT:
-        symbol_cell = ws[f"{SYMBOL_COL}{row}"]
-        price_cell  = ws[f"{PRICE_COL}{row}"]
-        symbol      = symbol_cell.value
+    changes = changed_cells(before, {f"{PRICE_COL}{row}": price for row, price in prices.items()})
+    with PROFILER.stage("save_workbook"):
+        save_patched(input_path, output_path, changes)
 
-        if symbol is None:
-            empty_count += 1
-        else:
-            ticker = str(symbol).strip().upper()
-            if ticker == "TICKER":
-                row += 1
-                continue
-
-            if not is_yellow(price_cell):
-                log_warn(f"Skipping row {row} (not yellow)")
-            else:
-                empty_count = 0
-                try:
-                    price = fetch_cmc_price(ticker)
-                    if price is not None:
-                        rounded = smart_round(price)
-                        price_cell.value = rounded
-                        log_ok(f"{ticker}: ${rounded} successfully imported")
-                    else:
-                        log_warn(f"Symbol {ticker} not found in CMC response.")
-                except Exception as e:
-                    log_err(f"Error fetching {ticker}: {e}")
-
-                time.sleep(REQUEST_DELAY)
-
-        row += 1
-
-    wb.save(str(output_path))
-    log_ok(f"Successfully updated prices")
+def save_patched(input_path: Path, output_path: Path, changes: dict) -> None:
+    try:
+        patch_cells(input_path, output_path, SHEET_NAME, changes)
+        log_info(f"Patched {len(changes)} cell(s) into {output_path.name}")
+    except XlsxPatchError as e:
+        log_warn(f"Cell patch not possible ({e}), saving the whole workbook")
+        wb = load_workbook(str(input_path))
+        for ref, value in changes.items():
+            wb[SHEET_NAME][ref].value = value
+        wb.save(str(output_path))
 
-def parse_args():
+def parse_args(argv=None):
     p = argparse.ArgumentParser(description="Update yellow prices in PERFORMANCE_TABLE.")
     p.add_argument("--input",  type=Path, default=DOCS_DIR / "Weekly_Performance_PORTFOLIO.xlsx",
                    help="Path to input Weekly_Performance_PORTFOLIO.xlsx")
     p.add_argument("--output", type=Path, default=DOCS_DIR / "Weekly_Performance_PORTFOLIO_latest.xlsx",
                    help="Path to output workbook")
-    return p.parse_args()
+    p.add_argument("--max-age", type=parse_age, default=None,
+                   help="Reuse prices from the local history store newer than this (e.g. 900, 15m, 2h)")
+    price_providers.add_arguments(p)
+    p.add_argument("--writer", choices=("openpyxl", "patch"), default=WRITER,
+                   help="'patch' writes only the changed cells into a copy of the input (default: XLSX_WRITER or openpyxl)")
+    http_client.add_arguments(p)
+    events.add_arguments(p)
+    p.add_argument("--profile", action="store_true",
+                   help="Write per-stage cProfile dumps and a memory report to docs/profiles/")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    http_client.configure_from_args(args)
+    events.configure(args.events)
+    price_providers.configure_from_args(args)
+    PROFILER.enabled = args.profile
+    try:
+        run(args.input, args.output, max_age=args.max_age, writer=args.writer)
+    finally:
+        PROFILER.write_report()
 
 if __name__ == "__main__":
-    args = parse_args()
-    run(args.input, args.output)
+    main()
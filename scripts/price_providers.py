@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from http_cache import CACHE
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+# Spot prices from several sources behind one call. A PriceRouter asks the first provider in
+# PRICE_PROVIDERS for every asset; whatever it has not answered after HEDGE_AFTER seconds (slow,
+# failed, or simply unknown to it) is asked of the next one, and so on, all inside a total
+# PRICE_BUDGET. The first answer per asset wins and keeps the provider's name as its source,
+# which record() stores in the history store and the stages print next to the price.
+PROVIDERS   = os.environ.get("PRICE_PROVIDERS", "cmc,coingecko,defillama")
+HEDGE_AFTER = float(os.environ.get("PRICE_HEDGE_AFTER", "2"))
+BUDGET      = float(os.environ.get("PRICE_BUDGET", "30"))
+THREADS     = int(os.environ.get("PRICE_THREADS", "8"))
+
+CMC_QUOTE_URL      = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+COINGECKO_URL      = os.environ.get("COINGECKO_URL", "https://api.coingecko.com/api/v3/simple/price")
+LLAMA_COINS_URL    = "https://coins.llama.fi/prices/current/"
+LLAMA_LISTING_URL  = "https://api.llama.fi/protocols"
+LLAMA_CHAINS_URL   = "https://api.llama.fi/chains"
+
+# key: the history-store asset key the caller wants the price under ("cmc:1", "sym:BTC").
+# shared: the ticker belongs to several CMC coins and cmc_id was picked by name, so only a
+# lookup by that id gives the right coin.
+Asset = namedtuple("Asset", ("key", "ticker", "cmc_id", "shared"), defaults=(False,))
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+class Provider:
+    # Providers other than CMC look assets up by ticker and answer for whichever coin they list
+    # under it, so they never get assets whose ticker is shared.
+    name       = ""
+    batch_size = 100
+
+    def supports(self, asset: Asset) -> bool:
+        return not asset.shared
+
+    def fetch(self, assets: list) -> dict:
+        # {asset.key: price} for one batch; assets it has no price for are simply left out.
+        raise NotImplementedError
+
+class CmcProvider(Provider):
+    name       = "cmc"
+    batch_size = int(os.environ.get("CMC_BATCH_SIZE", "100"))
+
+    def __init__(self, api_key: str | None):
+        self.headers = {"X-CMC_PRO_API_KEY": api_key} if api_key else {}
+
+    def supports(self, asset: Asset) -> bool:
+        return bool(self.headers)
+
+    def fetch(self, assets: list) -> dict:
+        # One request per id batch and one per symbol batch, as the stages always did. Without
+        # skip_invalid a single unknown symbol or id turns the whole batch into a 400.
+        out = {}
+        for param, group in (("id", [a for a in assets if a.cmc_id]), ("symbol", [a for a in assets if not a.cmc_id])):
+            if not group:
+                continue
+            values = list(dict.fromkeys(str(a.cmc_id or a.ticker) for a in group))
+            data = CACHE.get_json(CMC_QUOTE_URL, params={param: ",".join(values), "convert": "USD", "skip_invalid": "true"},
+                                  headers=self.headers).get("data") or {}
+            for a in group:
+                entry = data.get(str(a.cmc_id or a.ticker))
+                if isinstance(entry, list):
+                    entry = entry[0] if entry else None
+                try:
+                    out[a.key] = float(entry["quote"]["USD"]["price"])
+                except (KeyError, TypeError, ValueError):
+                    pass
+        return out
+
+class CoinGeckoProvider(Provider):
+    # /simple/price by symbol; for symbols shared by several coins CoinGecko answers with the
+    # largest by market cap.
+    name       = "coingecko"
+    batch_size = int(os.environ.get("COINGECKO_BATCH_SIZE", "50"))
+
+    def __init__(self, api_key: str | None = os.environ.get("COINGECKO_API_KEY")):
+        self.headers = {"x-cg-demo-api-key": api_key} if api_key else {}
+
+    def fetch(self, assets: list) -> dict:
+        symbols = list(dict.fromkeys(a.ticker.lower() for a in assets))
+        data = CACHE.get_json(COINGECKO_URL, params={"symbols": ",".join(symbols), "vs_currencies": "usd"},
+                              headers=self.headers) or {}
+        out = {}
+        for a in assets:
+            try:
+                out[a.key] = float(data[a.ticker.lower()]["usd"])
+            except (KeyError, TypeError, ValueError):
+                pass
+        return out
+
+class DefiLlamaProvider(Provider):
+    # coins.llama.fi takes coingecko:<id> keys. Tickers are mapped to CoinGecko ids with
+    # DefiLlama's own protocol listing (symbol, gecko_id) and chain list (tokenSymbol, gecko_id);
+    # a ticker listed with more than one gecko_id is left out rather than guessed. The mapping is
+    # downloaded by the first fetch(), on a router worker thread, so it counts against the price
+    # budget; tickers it does not cover come back unpriced.
+    name       = "defillama"
+    batch_size = int(os.environ.get("LLAMA_COINS_BATCH_SIZE", "100"))
+
+    def __init__(self):
+        self.gecko_ids = None
+        self.lock      = threading.Lock()
+
+    def _ids(self) -> dict:
+        with self.lock:
+            if self.gecko_ids is None:
+                ids = {}
+                for url, field in ((LLAMA_CHAINS_URL, "tokenSymbol"), (LLAMA_LISTING_URL, "symbol")):
+                    try:
+                        for entry in CACHE.get_json(url):
+                            sym, gid = str(entry.get(field) or "").upper(), entry.get("gecko_id")
+                            if sym and sym != "-" and gid:
+                                ids.setdefault(sym, set()).add(gid)
+                    except Exception as e:
+                        log_warn(f"DefiLlama {url} unavailable for ticker mapping: {e}")
+                self.gecko_ids = {sym: gids.pop() for sym, gids in ids.items() if len(gids) == 1}
+            return self.gecko_ids
+
+    def fetch(self, assets: list) -> dict:
+        ids    = self._ids()
+        mapped = [a for a in assets if a.ticker.upper() in ids]
+        if not mapped:
+            return {}
+        keys = list(dict.fromkeys(f"coingecko:{ids[a.ticker.upper()]}" for a in mapped))
+        data = (CACHE.get_json(LLAMA_COINS_URL + ",".join(keys)) or {}).get("coins") or {}
+        out = {}
+        for a in mapped:
+            try:
+                out[a.key] = float(data[f"coingecko:{ids[a.ticker.upper()]}"]["price"])
+            except (KeyError, TypeError, ValueError):
+                pass
+        return out
+
+def build_providers(names: str, cmc_api_key: str | None = None) -> list:
+    known = {"cmc": lambda: CmcProvider(cmc_api_key), "coingecko": CoinGeckoProvider, "defillama": DefiLlamaProvider}
+    out = []
+    for name in (n.strip().lower() for n in names.split(",") if n.strip()):
+        if name not in known:
+            raise ValueError(f"unknown price provider '{name}' (choose from {', '.join(known)})")
+        out.append(known[name]())
+    return out
+
+class PriceRouter:
+    def __init__(self, providers: list, hedge_after: float = HEDGE_AFTER, budget: float = BUDGET,
+                 threads: int = THREADS):
+        self.providers   = providers
+        self.hedge_after = hedge_after
+        self.budget      = budget
+        self.threads     = threads
+        # {provider name: keys it answered for without a price}, filled by fetch(). Only batches
+        # that came back count, so a slow or failed provider does not mark anything as unlisted.
+        self.missed      = {}
+
+    def fetch(self, assets: list, progress=None) -> dict:
+        # {asset.key: (price, provider name)}. progress.advance(n) is called as assets get priced.
+        assets  = list({a.key: a for a in assets}.values())
+        prices  = {}
+        self.missed = {}
+        if not assets or not self.providers:
+            return prices
+
+        deadline = time.monotonic() + self.budget
+        pending  = list(self.providers)
+        results  = queue.Queue()
+        slots    = threading.BoundedSemaphore(max(1, self.threads))
+        running  = [0]
+        done     = threading.Event()
+
+        def call(provider, batch) -> None:
+            with slots:
+                # Batches still waiting for a slot when fetch() returns are dropped rather than
+                # sent late, where they would spend rate-limit tokens and credits for nothing.
+                if done.is_set():
+                    return
+                try:
+                    results.put((provider, batch, provider.fetch(batch), None))
+                except Exception as e:
+                    results.put((provider, batch, None, e))
+
+        def launch() -> None:
+            while pending:
+                provider = pending.pop(0)
+                todo = [a for a in assets if a.key not in prices and provider.supports(a)]
+                if not todo:
+                    continue
+                if running[0]:
+                    log_info(f"Hedging {len(todo)} asset(s) to {provider.name}")
+                for batch in chunks(todo, provider.batch_size):
+                    # Daemon threads: a request still hanging when the budget is spent is
+                    # abandoned and does not hold up the process on exit.
+                    threading.Thread(target=call, args=(provider, batch), name=f"price-{provider.name}",
+                                     daemon=True).start()
+                    running[0] += 1
+                return
+
+        try:
+            launch()
+            hedge_at = time.monotonic() + self.hedge_after
+            while running[0]:
+                now = time.monotonic()
+                if now >= deadline:
+                    log_warn(f"Price budget of {self.budget:g}s spent, {len(assets) - len(prices)} asset(s) unpriced")
+                    break
+                try:
+                    provider, batch, got, error = results.get(timeout=max(0.0, min(hedge_at, deadline) - now))
+                except queue.Empty:
+                    pass
+                else:
+                    running[0] -= 1
+                    if error is not None:
+                        log_warn(f"{provider.name} price request failed: {error}")
+                    else:
+                        self.missed.setdefault(provider.name, set()).update(a.key for a in batch if a.key not in got)
+                        new = {k: (v, provider.name) for k, v in got.items() if k not in prices}
+                        prices.update(new)
+                        if progress is not None and new:
+                            progress.advance(len(new))
+                if len(prices) == len(assets):
+                    break
+                # Next provider once the current ones are all done or the hedge delay has passed.
+                if pending and (not running[0] or time.monotonic() >= hedge_at):
+                    launch()
+                    hedge_at = time.monotonic() + self.hedge_after
+        finally:
+            done.set()
+        return prices
+
+def history_key(asset: Asset, source: str) -> str:
+    # Only CMC answers by id; a price another provider found by ticker is filed under sym:<ticker>
+    # so it is never reused as the price of a specific cmc:<id>.
+    return asset.key if source == CmcProvider.name or not asset.cmc_id else f"sym:{asset.ticker}"
+
+def record(store, quoted: dict, assets, kind: str = "price") -> None:
+    # Writes {key: (value, source)} for the given assets to the history store, one batch per source.
+    by_key    = {a.key: a for a in assets}
+    by_source = {}
+    for key, (value, source) in quoted.items():
+        by_source.setdefault(source, {})[history_key(by_key[key], source)] = value
+    for source, values in by_source.items():
+        store.record(kind, values, source=source)
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--providers", default=PROVIDERS,
+                        help="Price providers in order of preference (default PRICE_PROVIDERS or cmc,coingecko,defillama)")
+    parser.add_argument("--price-budget", type=float, default=BUDGET,
+                        help="Seconds allowed for all price requests, hedges included (default PRICE_BUDGET or 30)")
+    parser.add_argument("--hedge-after", type=float, default=HEDGE_AFTER,
+                        help="Seconds before unanswered assets are also asked of the next provider (default 2)")
+
+def configure(providers: str | None = None, budget: float | None = None, hedge_after: float | None = None) -> None:
+    global PROVIDERS, BUDGET, HEDGE_AFTER
+    PROVIDERS   = providers or PROVIDERS
+    BUDGET      = budget if budget is not None else BUDGET
+    HEDGE_AFTER = hedge_after if hedge_after is not None else HEDGE_AFTER
+
+def configure_from_args(args) -> None:
+    configure(getattr(args, "providers", None), getattr(args, "price_budget", None), getattr(args, "hedge_after", None))
+
+def router(cmc_api_key: str | None) -> PriceRouter:
+    return PriceRouter(build_providers(PROVIDERS, cmc_api_key), hedge_after=HEDGE_AFTER, budget=BUDGET)
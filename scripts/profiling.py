@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+
+SCRIPT_DIR  = Path(__file__).resolve().parent
+APP_BASE    = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
+DOCS_DIR    = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+PROFILE_DIR = DOCS_DIR / "profiles"
+
+TOP_FUNCTIONS   = 15
+TOP_ALLOCATIONS = 10
+
+class Profiler:
+    # --profile: one cProfile dump per stage (<stage>.prof, open with snakeviz or pstats) plus a
+    # report.txt with wall time, tracemalloc peak, hottest functions and largest allocation sites.
+    # cProfile only sees the calling thread, so worker-pool requests show up as time spent waiting.
+    def __init__(self, enabled: bool = False, root: Path = PROFILE_DIR, name: str = "run"):
+        self.enabled = enabled
+        self.root    = Path(root)
+        self.name    = name
+        self.dir     = None
+        self.stages  = []
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        if self.dir is None:
+            self.dir = self.root / f"{self.name}-{datetime.now():%Y%m%d-%H%M%S}"
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        prof  = cProfile.Profile()
+        start = time.perf_counter()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            seconds = time.perf_counter() - start
+            peak    = tracemalloc.get_traced_memory()[1]
+            top     = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            self.dir.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(str(self.dir / f"{name}.prof"))
+            self.stages.append((name, seconds, peak, prof, top))
+            log_info(f"Profiled {name}: {seconds:.2f}s, peak {peak / 2**20:.1f} MB")
+
+    def write_report(self) -> Path | None:
+        if not self.enabled or not self.stages:
+            return None
+
+        out = io.StringIO()
+        out.write(f"{'stage':<36} {'seconds':>9} {'peak MB':>9}\n")
+        for name, seconds, peak, _, _ in self.stages:
+            out.write(f"{name:<36} {seconds:>9.3f} {peak / 2**20:>9.1f}\n")
+
+        for name, seconds, peak, prof, top in self.stages:
+            out.write(f"\n=== {name} ===\n\nTop functions by cumulative time:\n")
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            out.write("Top allocation sites still held at stage end:\n")
+            for stat in top:
+                out.write(f"  {stat}\n")
+
+        path = self.dir / "report.txt"
+        path.write_text(out.getvalue(), encoding="utf-8")
+        log_ok(f"Profile written to {self.dir}")
+        # Start a fresh directory next time (the desktop worker profiles many runs per process).
+        self.dir, self.stages = None, []
+        return path
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+# Requests per minute allowed by each provider (credits per minute for CMC, see credit_cost).
+# CMC Basic/Hobbyist plans allow 30.
+HOST_LIMITS = {
+    "pro-api.coinmarketcap.com": int(os.environ.get("CMC_RATE_LIMIT", "30")),
+    "api.llama.fi":              int(os.environ.get("LLAMA_RATE_LIMIT", "120")),
+    "api.coingecko.com":         int(os.environ.get("COINGECKO_RATE_LIMIT", "30")),
+    "coins.llama.fi":            int(os.environ.get("LLAMA_COINS_RATE_LIMIT", "120")),
+}
+# CMC bills quote calls in credits: one per 100 ids/symbols (historical: per 100 ids), one per
+# map call. The CMC bucket is charged that cost, so a 250-id batch spends three of its tokens.
+CMC_HOST         = "pro-api.coinmarketcap.com"
+CMC_PER_CREDIT   = 100
+CMC_BATCHED_PATH = ("/cryptocurrency/quotes/",)
+
+DEFAULT_LIMIT = 60
+BURST         = 5
+MAX_RETRIES   = 4
+MAX_BACKOFF   = 120.0
+
+class TokenBucket:
+    def __init__(self, per_minute: int, burst: int = BURST):
+        self.rate     = max(per_minute, 1) / 60.0
+        self.capacity = float(max(1, min(burst, per_minute)))
+        self.tokens   = self.capacity
+        self.updated  = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost: float = 1.0) -> float:
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self.blocked_until - now
+                if delay <= 0:
+                    # A call costing more than the burst goes once the bucket is full and leaves
+                    # it in debt, instead of waiting for tokens it can never hold.
+                    need = min(cost, self.capacity)
+                    if self.tokens >= need:
+                        self.tokens -= cost
+                        return waited
+                    delay = (need - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = now
+
+def credit_cost(url: str, params=None) -> float:
+    # Tokens a request takes from its host's bucket: CMC credits for CMC, 1 for everything else.
+    parts = urlsplit(url)
+    if parts.hostname != CMC_HOST or not any(p in parts.path for p in CMC_BATCHED_PATH):
+        return 1.0
+    values = sum(len([v for v in str((params or {}).get(k, "")).split(",") if v]) for k in ("id", "symbol", "slug"))
+    return float(max(1, math.ceil(values / CMC_PER_CREDIT)))
+
+def retry_after(response, attempt: int) -> float:
+    headers = getattr(response, "headers", None) or {}
+    for name in ("Retry-After", "X-RateLimit-Reset-After", "RateLimit-Reset"):
+        v = headers.get(name)
+        if not v:
+            continue
+        try:
+            return min(float(v), MAX_BACKOFF)
+        except ValueError:
+            pass
+        try:
+            return min(max(parsedate_to_datetime(v).timestamp() - time.time(), 0.0), MAX_BACKOFF)
+        except (TypeError, ValueError):
+            pass
+    return min(2.0 ** (attempt + 1), MAX_BACKOFF)
+
+class RateLimiter:
+    def __init__(self, limits: dict | None = None):
+        self.limits  = dict(HOST_LIMITS if limits is None else limits)
+        self.buckets = {}
+        self.lock    = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).hostname or ""
+        with self.lock:
+            b = self.buckets.get(host)
+            if b is None:
+                b = self.buckets[host] = TokenBucket(self.limits.get(host, DEFAULT_LIMIT))
+            return b
+
+    def wait(self, url: str, cost: float = 1.0) -> float:
+        return self.bucket(url).acquire(cost)
+
+    def backoff(self, url: str, response, attempt: int) -> float:
+        delay = retry_after(response, attempt)
+        self.bucket(url).pause(delay)
+        return delay
+
+LIMITER = RateLimiter()
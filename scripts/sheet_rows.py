@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+def is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+@lru_cache(maxsize=None)
+def row_type(columns: tuple):
+    return namedtuple("SheetRow", ("row",) + columns)
+
+def iter_sheet_rows(ws, start_row: int, columns, is_empty=None, stop_empty_limit: int = 10):
+    # Yields SheetRow(row, <col>=value, ...) for just the requested columns. Rows for
+    # which is_empty() holds (default: blank first column) are skipped; the scan stops after
+    # stop_empty_limit consecutive empty rows, like the stage loops always did.
+    columns = tuple(columns)
+    Row     = row_type(columns)
+    idx     = [column_index_from_string(c) for c in columns]
+    lo, hi  = min(idx), max(idx)
+    offsets = [i - lo for i in idx]
+    is_empty = is_empty or (lambda rec: is_blank(rec[1]))
+
+    empty = 0
+    for r, values in enumerate(ws.iter_rows(min_row=start_row, min_col=lo, max_col=hi, values_only=True),
+                               start=start_row):
+        rec = Row(r, *(values[o] if o < len(values) else None for o in offsets))
+        if is_empty(rec):
+            empty += 1
+            if empty >= stop_empty_limit:
+                break
+            continue
+        empty = 0
+        yield rec
+
+def column_values(ws, columns, start_row: int) -> dict:
+    # {"H5": value, ...} for every row from start_row down, used to diff a sheet before/after a stage.
+    out = {}
+    for col in columns:
+        idx = column_index_from_string(col)
+        for r, (value,) in enumerate(ws.iter_rows(min_row=start_row, min_col=idx, max_col=idx, values_only=True),
+                                     start=start_row):
+            out[f"{col}{r}"] = value
+    return out
+
+def read_rows(path: Path, sheet_name: str, start_row: int, columns, **kwargs) -> list:
+    wb = load_workbook(str(path), read_only=True)
+    try:
+        return list(iter_sheet_rows(wb[sheet_name], start_row, columns, **kwargs))
+    finally:
+        wb.close()
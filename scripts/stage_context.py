@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from history_store import HistoryStore
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+APP_BASE   = Path(os.environ.get("APP_BASE", SCRIPT_DIR.parent)).resolve()
+DOCS_DIR   = Path(os.environ.get("DOCS_DIR", APP_BASE / "docs")).resolve()
+
+@dataclass
+class StageContext:
+    ws: Any = None
+    docs_dir: Path = DOCS_DIR
+    api_key: Optional[str] = None
+    workers: int = 8
+    engine: str = "protocol"
+    max_age: Optional[float] = None
+    # None: copy H into F; "" or "YYYY-MM": write that month's closes (default: previous month).
+    backfill: Optional[str] = None
+    # Reference data fetched by one stage and reused by later ones or later runs
+    # (e.g. "cmc_symbol_map", "chain_index").
+    shared: dict = field(default_factory=dict)
+
+    def history(self):
+        if "history" not in self.shared:
+            self.shared["history"] = HistoryStore()
+        return self.shared["history"]
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import codecs
+import copy
+import math
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import coordinate_to_tuple
+
+# Writes cell values straight into an existing .xlsx instead of load_workbook + wb.save:
+#   - only the target worksheet XML is decompressed, streamed row by row and recompressed;
+#   - the patched cells keep their style (s="…"); everything else in the sheet is left as-is;
+#   - every other zip member (other sheets, charts, styles, shared strings, …) is copied as
+#     its raw compressed bytes, so it comes out byte-for-byte identical and costs no CPU.
+# Cost scales with the size of one sheet plus the cells changed, not with the workbook.
+#
+# Cached results of formulas that depend on patched cells are stale until Excel recalculates,
+# so the workbook is flagged fullCalcOnLoad. Callers that reorder rows or touch formulas keep
+# using openpyxl; anything this module cannot patch safely raises XlsxPatchError.
+
+CHUNK = 1 << 16
+
+ROW_RE   = re.compile(r"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+ROW_NUM  = re.compile(r'\br="(\d+)"')
+CELL_RE  = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+ATTR_RE  = re.compile(r'([\w:]+)="([^"]*)"')
+SHEETDATA_END = re.compile(r"</sheetData>|<sheetData\s*/>")
+
+class XlsxPatchError(Exception):
+    pass
+
+def _sheet_part(zin: zipfile.ZipFile, sheet_name: str) -> str:
+    # Zip member of a sheet, via workbook.xml (name -> r:id) and its relationships (r:id -> part).
+    workbook = zin.read("xl/workbook.xml").decode("utf-8")
+    rid = None
+    for m in re.finditer(r"<sheet\b([^>]*)/?>", workbook):
+        attrs = dict(ATTR_RE.findall(m.group(1)))
+        if _unescape(attrs.get("name", "")) == sheet_name:
+            rid = next((v for k, v in attrs.items() if k.endswith(":id")), None)
+            break
+    if rid is None:
+        raise XlsxPatchError(f"Sheet '{sheet_name}' not found")
+
+    rels = zin.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+    for m in re.finditer(r"<Relationship\b([^>]*)/?>", rels):
+        attrs = dict(ATTR_RE.findall(m.group(1)))
+        if attrs.get("Id") == rid:
+            target = attrs["Target"]
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+    raise XlsxPatchError(f"No relationship {rid} for sheet '{sheet_name}'")
+
+def _unescape(text: str) -> str:
+    return (text.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"')
+                .replace("&apos;", "'").replace("&amp;", "&"))
+
+def _cell_xml(ref: str, value, attrs: dict) -> str:
+    # attrs: the existing cell's attributes minus type/value-metadata ones (keeps s="…").
+    head = f'<c r="{ref}"' + "".join(f' {k}="{v}"' for k, v in attrs.items())
+    if value is None:
+        return head + "/>"
+    if isinstance(value, bool):
+        return head + f' t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if isinstance(value, float) and not math.isfinite(value):
+            raise XlsxPatchError(f"{ref}: cannot store {value}")
+        return head + f"><v>{value!r}</v></c>"
+    if isinstance(value, str):
+        return head + f' t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+    raise XlsxPatchError(f"{ref}: unsupported value type {type(value).__name__}")
+
+def _patch_row(row_xml: str, row: int, cells: dict, state: dict) -> str:
+    # cells: {column index: (ref, value)} for this row.
+    pending = dict(cells)
+
+    def replace(m):
+        attrs = dict(ATTR_RE.findall(m.group(1)))
+        ref   = attrs.get("r")
+        if ref is None:
+            raise XlsxPatchError(f"Row {row} has cells without references")
+        col = coordinate_to_tuple(ref)[1]
+        if col not in pending:
+            return m.group(0)
+        body = m.group(2) or ""
+        if "<f" in body:
+            if re.search(r'<f\b[^>]*\bt="shared"[^>]*\bref=', body):
+                raise XlsxPatchError(f"{ref} is the anchor of a shared formula")
+            state["formulas_removed"] = True
+        keep = {k: v for k, v in attrs.items() if k not in ("r", "t", "cm", "vm")}
+        ref, value = pending.pop(col)
+        return _cell_xml(ref, value, keep)
+
+    row_xml = CELL_RE.sub(replace, row_xml)
+    if not pending:
+        return row_xml
+
+    # New cells go in column order among the existing ones.
+    if row_xml.endswith("/>"):
+        row_xml = row_xml[:-2] + "></row>"
+    for col in sorted(pending):
+        ref, value = pending[col]
+        new = _cell_xml(ref, value, {})
+        pos = row_xml.rindex("</row>")
+        for m in CELL_RE.finditer(row_xml):
+            if coordinate_to_tuple(dict(ATTR_RE.findall(m.group(1)))["r"])[1] > col:
+                pos = m.start()
+                break
+        row_xml = row_xml[:pos] + new + row_xml[pos:]
+    return row_xml
+
+def _new_rows(rows: dict, upto: int | None) -> str:
+    out = []
+    for r in sorted(r for r in rows if upto is None or r < upto):
+        cells = rows.pop(r)
+        out.append(f'<row r="{r}">' + "".join(_cell_xml(ref, v, {}) for _, (ref, v) in sorted(cells.items())) + "</row>")
+    return "".join(out)
+
+def _stream_sheet(src, dst, rows: dict, state: dict) -> None:
+    # Copies the sheet XML from src to dst, rewriting only the rows that hold target cells.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buf     = ""
+    in_data = False
+    while True:
+        chunk = src.read(CHUNK)
+        buf += decoder.decode(chunk, final=not chunk)
+        if not in_data:
+            i = buf.find("<sheetData")
+            if i < 0:
+                if not chunk:
+                    raise XlsxPatchError("Worksheet has no <sheetData>")
+                continue
+            in_data = True
+        out, pos = [], 0
+        for m in ROW_RE.finditer(buf):
+            num = ROW_NUM.search(m.group(0)[:m.group(0).find(">") + 1])
+            if num is None:
+                raise XlsxPatchError("Row without a row number")
+            r = int(num.group(1))
+            out.append(buf[pos:m.start()])
+            out.append(_new_rows(rows, r))
+            out.append(_patch_row(m.group(0), r, rows.pop(r), state) if r in rows else m.group(0))
+            pos = m.end()
+        end = SHEETDATA_END.search(buf, pos)
+        if end:
+            out.append(buf[pos:end.start()])
+            tail = _new_rows(rows, None)
+            out.append(f"<sheetData>{tail}</sheetData>" if end.group(0) != "</sheetData>" else tail + "</sheetData>")
+            out.append(buf[end.end():])
+            dst.write("".join(out).encode("utf-8") + decoder.getstate()[0])
+            while chunk:
+                chunk = src.read(CHUNK)
+                dst.write(chunk)
+            return
+        if not chunk:
+            raise XlsxPatchError("Unterminated <sheetData>")
+        # Keep the incomplete tail (a row split across chunks) for the next round.
+        dst.write("".join(out).encode("utf-8"))
+        buf = buf[pos:]
+
+def _copy_raw(zin: zipfile.ZipFile, zout: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    # Moves the member's compressed bytes across unchanged (no inflate/deflate).
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(30)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    zin.fp.seek(info.header_offset + 30 + name_len + extra_len)
+    data = zin.fp.read(info.compress_size)
+
+    new = copy.copy(info)
+    new.flag_bits &= ~0x08          # sizes go in the local header, no trailing data descriptor
+    new.header_offset = zout.fp.tell()
+    zout.fp.write(new.FileHeader())
+    zout.fp.write(data)
+    zout.filelist.append(new)
+    zout.NameToInfo[new.filename] = new
+    zout.start_dir  = zout.fp.tell()
+    zout._didModify = True
+
+def _without_calc_chain(zin: zipfile.ZipFile, name: str) -> bytes:
+    text = zin.read(name).decode("utf-8")
+    if name == "[Content_Types].xml":
+        text = re.sub(r'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', "", text)
+    else:
+        text = re.sub(r'<Relationship\b[^>]*Target="[^"]*calcChain\.xml"[^>]*/>', "", text)
+    return text.encode("utf-8")
+
+def _with_full_calc(zin: zipfile.ZipFile) -> bytes:
+    text = zin.read("xl/workbook.xml").decode("utf-8")
+    m = re.search(r"<calcPr\b[^>]*?/?>", text)
+    if m is None:
+        text = text.replace("</workbook>", '<calcPr fullCalcOnLoad="1"/></workbook>', 1)
+    elif "fullCalcOnLoad" not in m.group(0):
+        tag = m.group(0)
+        tag = tag[:-2] + ' fullCalcOnLoad="1"/>' if tag.endswith("/>") else tag[:-1] + ' fullCalcOnLoad="1">'
+        text = text[:m.start()] + tag + text[m.end():]
+    return text.encode("utf-8")
+
+def same(a, b) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+    return a == b
+
+def changed_cells(before: dict, after: dict) -> dict:
+    # {ref: value} for the cells of `after` whose value differs from `before` (floats compared
+    # with a relative tolerance, so re-writing the same price is not a change).
+    return {ref: v for ref, v in after.items() if not same(before.get(ref), v)}
+
+def patch_cells(src: Path, dst: Path, sheet_name: str, values: dict) -> int:
+    # values: {"H5": 1.23, "O5": "N/A", ...}. src and dst may be the same file (written via a
+    # temp file and renamed). Returns the number of cells written.
+    src, dst = Path(src), Path(dst)
+    rows = {}
+    for ref, value in values.items():
+        r, c = coordinate_to_tuple(ref.upper())
+        rows.setdefault(r, {})[c] = (ref.upper(), value)
+
+    tmp   = dst.with_name(f".{dst.name}.patch.tmp")
+    state = {"formulas_removed": False}
+    try:
+        with zipfile.ZipFile(src) as zin, zipfile.ZipFile(tmp, "w") as zout:
+            part  = _sheet_part(zin, sheet_name)
+            infos = zin.infolist()
+            info  = zin.getinfo(part)
+            with zin.open(info) as s, zout.open(_fresh_info(info), "w", force_zip64=info.file_size > 2**30) as d:
+                _stream_sheet(s, d, rows, state)
+
+            drop_chain = state["formulas_removed"] and "xl/calcChain.xml" in zin.NameToInfo
+            for other in infos:
+                name = other.filename
+                if name == part or (drop_chain and name == "xl/calcChain.xml"):
+                    continue
+                if name == "xl/workbook.xml":
+                    zout.writestr(_fresh_info(other), _with_full_calc(zin))
+                elif drop_chain and name in ("[Content_Types].xml", "xl/_rels/workbook.xml.rels"):
+                    zout.writestr(_fresh_info(other), _without_calc_chain(zin, name))
+                elif other.flag_bits & 0x01:
+                    raise XlsxPatchError(f"Encrypted member {name}")
+                else:
+                    _copy_raw(zin, zout, other)
+        os.replace(tmp, dst)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return len(values)
+
+def _fresh_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    new = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    new.compress_type = zipfile.ZIP_DEFLATED
+    new.external_attr = info.external_attr
+    return new
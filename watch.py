@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+import signal
+import argparse
+from pathlib import Path
+
+BASE = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent))
+
+sys.path.insert(0, str(BASE))
+sys.path.insert(0, str(BASE / 'scripts'))
+
+from openpyxl import load_workbook
+
+import http_client
+import events
+import price_providers
+from http_cache import CACHE
+from history_store import parse_age
+from stage_context import StageContext
+from sheet_rows import column_values
+from xlsx_patch import patch_cells, changed_cells, XlsxPatchError
+
+import onchain
+import performance_table_update_prices as performance
+
+def log_ok(msg):   print(f"[OK] {msg}",   flush=True)
+def log_info(msg): print(f"[INFO] {msg}", flush=True)
+def log_warn(msg): print(f"[WARN] {msg}", flush=True)
+def log_err(msg):  print(f"[ERR] {msg}",  flush=True)
+
+INTERVAL = os.environ.get("WATCH_INTERVAL", "15m")
+
+# Headless refresh loop. Every interval each watched workbook is re-priced in place:
+#   - workbooks stay parsed between ticks and are only reloaded when the file changed on disk;
+#   - the stages run with --max-age = half the interval, so only assets whose history-store
+#     value is older than that are fetched (values stored by the previous tick are stale again
+#     by the next one; a max-age of a full interval would skip every other tick);
+#   - the price/TVL cells are compared before and after, and the workbook is only saved when
+#     at least one of them moved; the save patches just those cells into the file (xlsx_patch),
+#     falling back to a full openpyxl save (atomically, via a temp file) if that is not possible.
+# Row order, the monthly price column and formulas are left alone: that stays the job of
+# the full monthly/weekly runs. Stops on Ctrl+C or SIGTERM; --once runs a single tick.
+
+class Watched:
+    def __init__(self, label: str, path: Path, sheet: str, columns: tuple, start_row: int, update):
+        self.label     = label
+        self.path      = path
+        self.sheet     = sheet
+        self.columns   = columns
+        self.start_row = start_row
+        self.update    = update
+        self.wb        = None
+        self.mtime     = None
+
+    def load(self) -> None:
+        mtime = self.path.stat().st_mtime_ns
+        if self.wb is not None and mtime == self.mtime:
+            return
+        if self.wb is not None:
+            log_info(f"{self.path.name} changed on disk, reloading")
+        self.wb    = load_workbook(str(self.path))
+        self.mtime = mtime
+        if self.sheet not in self.wb.sheetnames:
+            self.wb = None
+            raise SystemExit(f"Sheet '{self.sheet}' not found in {self.path.name}")
+
+    def snapshot(self) -> dict:
+        return column_values(self.wb[self.sheet], self.columns, self.start_row)
+
+    def save(self, changes: dict) -> None:
+        try:
+            patch_cells(self.path, self.path, self.sheet, changes)
+        except XlsxPatchError as e:
+            log_warn(f"{self.path.name}: cell patch not possible ({e}), saving the whole workbook")
+            tmp = self.path.with_name(f".{self.path.stem}.watch.tmp.xlsx")
+            self.wb.save(str(tmp))
+            os.replace(tmp, self.path)
+        self.mtime = self.path.stat().st_mtime_ns
+        events.file_written(self.path)
+
+    def tick(self) -> int:
+        self.load()
+        before = self.snapshot()
+        with http_client.stage(f"watch:{self.label}"):
+            self.update(self.wb[self.sheet])
+        changes = changed_cells(before, self.snapshot())
+        changed = len(changes)
+        if not changed:
+            log_info(f"{self.path.name}: no changes, not saved")
+            return 0
+        try:
+            self.save(changes)
+        except PermissionError:
+            # Typically Excel holding the file open on Windows. The workbook is reloaded next
+            # tick and the same values come back from the history store, so the save is retried.
+            log_warn(f"{self.path.name} is locked, will retry the save next tick")
+            self.mtime = None
+            return 0
+        log_ok(f"{self.path.name}: {changed} cell(s) changed, saved")
+        return changed
+
+def watched_workbooks(args, ctx) -> list:
+    out = []
+    if args.onchain:
+        def update_onchain(ws):
+            ctx.ws = ws
+            for module in (onchain.onchain_update_prices, onchain.onchain_update_tvl):
+                module.run(ctx)
+        prices, tvl = onchain.onchain_update_prices, onchain.onchain_update_tvl
+        out.append(Watched("onchain", args.onchain, onchain.SHEET_NAME,
+                           (prices.PRICE_COL, tvl.TVL_COL), prices.START_ROW, update_onchain))
+    if args.performance:
+        headers = {"X-CMC_PRO_API_KEY": ctx.api_key}
+        out.append(Watched("performance", args.performance, performance.SHEET_NAME,
+                           (performance.PRICE_COL,), performance.START_ROW,
+                           lambda ws: performance.update_prices(ws, headers, store=ctx.history(),
+                                                                max_age=ctx.max_age)))
+    return out
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Keep ONCHAIN / PERFORMANCE_TABLE workbooks re-priced on an interval.")
+    p.add_argument("--onchain", type=Path, help="Workbook whose ONCHAIN prices (H) and TVL (O) are refreshed")
+    p.add_argument("--performance", type=Path, help="Workbook whose yellow PERFORMANCE_TABLE prices (E) are refreshed")
+    p.add_argument("--interval", type=parse_age, default=parse_age(INTERVAL),
+                   help="Time between refreshes (e.g. 300, 5m, 1h; default WATCH_INTERVAL or 15m)")
+    p.add_argument("--max-age", type=parse_age, default=None,
+                   help="Refetch assets whose stored value is older than this (default: half the interval)")
+    p.add_argument("--once", action="store_true", help="Run a single refresh and exit (e.g. from cron)")
+    p.add_argument("--no-cache", action="store_true", help="Bypass the on-disk HTTP response cache")
+    p.add_argument("--workers", type=int, default=onchain.onchain_update_tvl.WORKERS,
+                   help="Concurrent DefiLlama /protocol requests")
+    price_providers.add_arguments(p)
+    http_client.add_arguments(p)
+    events.add_arguments(p)
+    args = p.parse_args(argv)
+    if not args.onchain and not args.performance:
+        p.error("give --onchain and/or --performance")
+    return args
+
+def main():
+    args = parse_args()
+    CACHE.enabled = CACHE.enabled and not args.no_cache
+    http_client.configure_from_args(args)
+    events.configure(args.events)
+    price_providers.configure_from_args(args)
+
+    ctx = StageContext(docs_dir=onchain.DOCS_DIR, workers=args.workers,
+                       max_age=args.max_age if args.max_age is not None else args.interval / 2)
+    ctx.api_key = onchain.onchain_update_prices.load_api_key()
+    targets = watched_workbooks(args, ctx)
+    for t in targets:
+        if not t.path.exists():
+            log_err(f"Workbook not found: {t.path}")
+            sys.exit(1)
+
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    log_ok(f"Watching {', '.join(t.path.name for t in targets)} every {args.interval:g}s")
+
+    loaded_at = time.monotonic()
+    try:
+        while not stop:
+            started = time.monotonic()
+            changed = 0
+            for t in targets:
+                try:
+                    changed += t.tick()
+                except SystemExit as e:
+                    log_err(f"{t.path.name}: {e.code}")
+                except Exception as e:
+                    log_err(f"{t.path.name}: refresh failed: {e}")
+            http_client.log_stats()
+            http_client.STATS.clear()
+            events.emit("watch_tick", changed=changed, seconds=round(time.monotonic() - started, 3))
+            if args.once:
+                break
+            # Reference data (CMC map, chain index) is dropped once a day so new listings show up.
+            if time.monotonic() - loaded_at > 86400:
+                ctx.shared = {"history": ctx.history()}
+                loaded_at  = time.monotonic()
+            deadline = started + args.interval
+            while not stop and time.monotonic() < deadline:
+                time.sleep(max(0.0, min(1.0, deadline - time.monotonic())))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ctx.history().close()
+    log_ok("Watch stopped")
+
+if __name__ == "__main__":
+    main()
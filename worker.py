@@ -0,0 +1,218 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+BASE = Path(getattr(sys, '_MEIPASS', Path(__file__).resolve().parent))
+
+sys.path.insert(0, str(BASE))
+sys.path.insert(0, str(BASE / 'scripts'))
+
+import events
+import http_client
+import price_providers
+from http_cache import CACHE
+from stage_context import StageContext
+
+import onchain
+import performance_table_update_prices as performance
+
+# Long-lived worker for the desktop app: newline-delimited JSON-RPC 2.0 on stdin/stdout.
+#
+#   -> {"jsonrpc": "2.0", "id": 1, "method": "run", "params": {"command": "monthly", "args": [...], "env": {...}}}
+#   <- {"jsonrpc": "2.0", "method": "log",   "params": {"run": 1, "line": "[OK] ..."}}
+#   <- {"jsonrpc": "2.0", "method": "event", "params": {"run": 1, "event": "rows_done", ...}}
+#   <- {"jsonrpc": "2.0", "id": 1, "result": {"ok": true, "seconds": 3.2}}
+#
+# Requests are handled one at a time. HTTP sessions, the response cache, the history store and
+# reference data (CMC map, chain index) stay loaded between runs; reference data is
+# dropped after REFERENCE_TTL seconds so a long-running app still picks up new listings.
+# Also answers ping, status and shutdown. The desktop app spawns one process per run instead
+# when NO_PY_WORKER=1.
+REFERENCE_TTL = float(os.environ.get("WORKER_REFERENCE_TTL", "3600"))
+REFERENCE_KEYS = ("cmc_symbol_map", "chain_index")
+
+# Module settings a run may change from its args; put back afterwards so they do not leak
+# into the next run, like the environment.
+RUN_SETTINGS = ((http_client, ("RECORD_DIR", "REPLAY_DIR", "REPLAY_LATENCY")),
+                (price_providers, ("PROVIDERS", "BUDGET", "HEDGE_AFTER")),
+                (events, ("TARGET",)))
+
+PARSE_ERROR      = -32700
+INVALID_REQUEST  = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS   = -32602
+RUN_FAILED       = -32000
+
+_out  = sys.stdout
+_lock = threading.Lock()
+
+class InvalidParams(Exception):
+    pass
+
+def send(message: dict) -> None:
+    line = json.dumps({"jsonrpc": "2.0", **message}, default=str)
+    with _lock:
+        _out.write(line + "\n")
+        _out.flush()
+
+def notify(method: str, params: dict) -> None:
+    send({"method": method, "params": params})
+
+class LogStream(io.TextIOBase):
+    # Replaces sys.stdout while a run is active: every printed line becomes a "log"
+    # notification and every events.py line an "event" notification for that run.
+    def __init__(self, run_id):
+        self.run_id  = run_id
+        self.pending = ""
+        self.lock    = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            self.pending += text
+            *lines, self.pending = self.pending.split("\n")
+        for line in lines:
+            self.emit(line)
+        return len(text)
+
+    def flush(self) -> None:
+        with self.lock:
+            line, self.pending = self.pending, ""
+        if line:
+            self.emit(line)
+
+    def emit(self, line: str) -> None:
+        if line.startswith(events.PREFIX):
+            try:
+                notify("event", {"run": self.run_id, **json.loads(line[len(events.PREFIX):])})
+                return
+            except ValueError:
+                pass
+        if line.strip():
+            notify("log", {"run": self.run_id, "line": line})
+
+class Worker:
+    def __init__(self):
+        self.ctx        = StageContext(docs_dir=onchain.DOCS_DIR)
+        self.loaded_at  = time.monotonic()
+        self.cache_on   = CACHE.enabled
+        self.runs       = 0
+        events.configure("stdout")
+
+    def expire_reference_data(self) -> None:
+        if time.monotonic() - self.loaded_at > REFERENCE_TTL:
+            for key in REFERENCE_KEYS:
+                self.ctx.shared.pop(key, None)
+            self.loaded_at = time.monotonic()
+
+    def run_monthly(self, argv: list) -> None:
+        args = onchain.parse_args(argv)
+        self.expire_reference_data()
+        # A fresh workbook per run; the history store and reference data in shared carry over.
+        self.ctx.api_key = os.environ.get("API_KEY") or None
+        onchain.run(args, self.ctx)
+        http_client.log_stats()
+        onchain.log_ok("All onchain scripts completed successfully.")
+
+    def run_weekly(self, argv: list) -> None:
+        performance.main(argv)
+
+    def run(self, run_id, params: dict) -> dict:
+        command = params.get("command")
+        handler = {"monthly": self.run_monthly, "weekly": self.run_weekly}.get(command)
+        if handler is None:
+            raise InvalidParams(f"unknown command '{command}'")
+
+        env      = {k: str(v) for k, v in (params.get("env") or {}).items()}
+        saved    = {k: os.environ.get(k) for k in env}
+        settings = [(module, name, getattr(module, name)) for module, names in RUN_SETTINGS for name in names]
+        os.environ.update(env)
+        CACHE.enabled = self.cache_on
+        http_client.STATS.clear()
+        self.runs += 1
+
+        stream, start = LogStream(run_id), time.monotonic()
+        previous, sys.stdout = sys.stdout, stream
+        try:
+            handler([str(a) for a in params.get("args") or []])
+        finally:
+            stream.flush()
+            sys.stdout = previous
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            for module, name, value in settings:
+                setattr(module, name, value)
+        return {"ok": True, "seconds": round(time.monotonic() - start, 3), "runs": self.runs}
+
+    def status(self) -> dict:
+        return {"pid": os.getpid(), "runs": self.runs, "shared": sorted(k for k in self.ctx.shared if k != "history")}
+
+def handle(worker: Worker, request: dict) -> None:
+    req_id = request.get("id")
+    method = request.get("method")
+    params = request.get("params") or {}
+
+    if not isinstance(method, str):
+        return send({"id": req_id, "error": {"code": INVALID_REQUEST, "message": "missing method"}})
+    if not isinstance(params, dict):
+        return send({"id": req_id, "error": {"code": INVALID_PARAMS, "message": "params must be an object"}})
+
+    try:
+        if method == "ping":
+            result = "pong"
+        elif method == "status":
+            result = worker.status()
+        elif method == "run":
+            result = worker.run(req_id, params)
+        elif method == "shutdown":
+            send({"id": req_id, "result": {"ok": True}})
+            sys.exit(0)
+        else:
+            return send({"id": req_id, "error": {"code": METHOD_NOT_FOUND, "message": f"unknown method '{method}'"}})
+    except SystemExit as e:
+        if method == "shutdown":
+            raise
+        # Stage scripts still signal failure with sys.exit(); report it instead of exiting.
+        message = e.code if isinstance(e.code, str) else f"exited with {e.code}"
+        return send({"id": req_id, "error": {"code": RUN_FAILED, "message": message}})
+    except InvalidParams as e:
+        return send({"id": req_id, "error": {"code": INVALID_PARAMS, "message": str(e)}})
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        return send({"id": req_id, "error": {"code": RUN_FAILED, "message": str(e)}})
+
+    if req_id is not None:
+        send({"id": req_id, "result": result})
+
+def main():
+    # Only send() writes to the real stdout. Anything printed outside a run (the background
+    # chain-index refresh, a price request that outlived its run) goes to stderr instead of
+    # landing in the RPC stream as a raw line.
+    sys.stdout = sys.stderr
+    worker = Worker()
+    notify("ready", {"pid": os.getpid()})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            send({"id": None, "error": {"code": PARSE_ERROR, "message": str(e)}})
+            continue
+        if not isinstance(request, dict):
+            send({"id": None, "error": {"code": INVALID_REQUEST, "message": "request must be an object"}})
+            continue
+        handle(worker, request)
+
+if __name__ == "__main__":
+    main()